@@ -0,0 +1,325 @@
+"""
+Micro-benchmarks de las rutas críticas con datos sintéticos (sin modelo ni cámaras).
+
+Mide tracker, zonas, rejillas de ocupación, estado de vehículos, colisiones, guardado de
+estadísticas, dashboard, anotaciones (redibujo vs capa cacheada) y el recorrido de frames
+(con y sin pool de buffers) para varios números de objetos y tamaños de frame. Guarda los
+resultados en JSON y los compara con una línea base: si algún caso es más lento que la base más la tolerancia,
+el proceso termina con código 1.
+
+Uso:
+    python benchmark.py                      # medir y comparar contra benchmark_baseline.json
+    python benchmark.py --update-baseline    # medir y guardar como nueva línea base
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import config as cfg
+import visualizer as vis
+from detector import VehicleDetector
+from frame_pool import FramePool
+from occupancy import OccupancyGrid
+from tracker import EuclideanDistTracker
+
+OBJECT_COUNTS = [10, 50, 200]
+FRAME_SIZES = [(480, 640), (1080, 1920)]
+GRID_SIZES = [(720, 960), (1080, 1440)]
+
+
+def synthetic_boxes(rng, n, height, width, size=40):
+    """Cajas [x, y, x2, y2] repartidas por el frame"""
+    x = rng.integers(0, width - size, n)
+    y = rng.integers(0, height - size, n)
+    return np.stack([x, y, x + size, y + size], axis=1)
+
+
+def jitter(rng, boxes, moving_fraction=0.5, step=25):
+    """Mueve una fracción de las cajas (en movimiento) y deja el resto casi quietas (detenidas)"""
+    n = len(boxes)
+    moving = rng.random(n) < moving_fraction
+    delta = np.where(moving[:, None], step, 2) * rng.integers(-1, 2, (n, 2))
+    return boxes + np.concatenate([delta, delta], axis=1)
+
+
+def measure(fn, repeat, budget):
+    """Tiempos por llamada en microsegundos (mediana, p95 y p99)"""
+    for _ in range(3):
+        fn()
+    samples = []
+    t_limit = time.perf_counter() + budget
+    while len(samples) < repeat and (len(samples) < 5 or time.perf_counter() < t_limit):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return {'min_us': samples[0], 'median_us': statistics.median(samples),
+            'p95_us': samples[int(0.95 * (len(samples) - 1))],
+            'p99_us': samples[int(0.99 * (len(samples) - 1))], 'runs': len(samples)}
+
+
+def allocated_kb(fn, iterations=20):
+    """Pico de memoria reservada por llamada (KB) según tracemalloc, incluidos los arreglos de numpy/OpenCV"""
+    fn()
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            fn()
+            total += tracemalloc.get_traced_memory()[1] - start  # Pico sobre lo vivo al empezar
+    finally:
+        tracemalloc.stop()
+    return total / iterations / 1024
+
+
+def build_system():
+    # Sin modelo, cámaras ni servicios en segundo plano
+    from main import TrafficLightSystem
+    return TrafficLightSystem(detector=VehicleDetector(load=False), start_services=False)
+
+
+def bench_tracker(results, rng, repeat, budget):
+    for n in OBJECT_COUNTS:
+        tracker = EuclideanDistTracker()
+        state = {'boxes': synthetic_boxes(rng, n, 720, 1280)}
+
+        def step():
+            state['boxes'] = jitter(rng, state['boxes'])
+            tracker.update(state['boxes'].tolist())
+
+        results[f"tracker_update/n={n}"] = measure(step, repeat, budget)
+
+
+def bench_zones(results, rng, repeat, budget):
+    detector = VehicleDetector(load=False)
+    main_zones, arrow_zones = cfg.get_zones(cfg.ESTE_IDX)
+    zones = [main_zones[0], arrow_zones[0]]
+    for n in OBJECT_COUNTS:
+        pts = rng.integers(0, 640, (n, 2)).tolist()
+
+        def step():
+            for xc, yc in pts:
+                detector.is_valid_detection(xc, yc, zones)
+
+        results[f"is_valid_detection/n={n}"] = measure(step, repeat, budget)
+
+
+def bench_occupancy(results, rng, repeat, budget):
+    main_zones, _ = cfg.get_zones(cfg.ESTE_IDX)
+    grid = OccupancyGrid(main_zones[0], cfg.OCCUPANCY_CELL, cfg.OCCUPANCY_HALF_LIFE)
+    for n in OBJECT_COUNTS:
+        state = {'boxes': synthetic_boxes(rng, n, 480, 640), 't': 0.0}
+
+        def step():
+            state['boxes'] = jitter(rng, state['boxes'])
+            state['t'] += 0.2
+            grid.update(state['boxes'], state['t'])
+            grid.queue_length()
+
+        results[f"occupancy_update/n={n}"] = measure(step, repeat, budget)
+
+
+def bench_vehicle_status(results, rng, repeat, budget, system):
+    ch = cfg.CAMERA_CHANNELS[cfg.ESTE_IDX]
+    zones = system.live_zones[ch]
+    for h, w in FRAME_SIZES:
+        for n in OBJECT_COUNTS:
+            system.vehicle_data[ch].clear()
+            system.trajectories[ch].clear()
+            ids = np.arange(n)
+            state = {'boxes': synthetic_boxes(rng, n, h, w)}
+
+            def step():
+                state['boxes'] = jitter(rng, state['boxes'])
+                tracked = np.concatenate([state['boxes'], ids[:, None]], axis=1).tolist()
+                # Sin frame de evidencia: una alerta solo se cuenta (sin disco ni webhook)
+                system.update_vehicle_status(ch, tracked, 'green', 'green', zones['main_path'],
+                                             zones['arrow_path'], None)
+
+            results[f"update_vehicle_status/{w}x{h}/n={n}"] = measure(step, repeat, budget)
+
+
+def bench_collisions(results, rng, repeat, budget, system):
+    ch = cfg.CAMERA_CHANNELS[cfg.ESTE_IDX]
+    for n in OBJECT_COUNTS:
+        table = system.vehicle_data[ch]
+        table.clear()
+        ids = np.arange(n)
+        centers = rng.integers(0, 1280, (n, 2))
+        green = np.ones(n, dtype=bool)
+        inside = np.zeros(n, dtype=bool)
+        # Todos detenidos en verde más allá de ACCIDENT_TIME
+        table.update(ids, centers, 0.0, inside, green, system.STOP_THRESHOLD, system.ACCIDENT_TIME)
+        table.update(ids, centers, system.ACCIDENT_TIME + 1.0, inside, green, system.STOP_THRESHOLD,
+                     system.ACCIDENT_TIME)
+
+        results[f"check_collisions/n={n}"] = measure(lambda: system.check_collisions(ch), repeat, budget)
+
+
+def bench_stats(results, repeat, budget, system):
+    results["stats_save_snapshot"] = measure(lambda: system.stats_manager.save_snapshot(force=True), repeat, budget)
+
+
+def bench_dashboard(results, rng, repeat, budget, system):
+    info = {'phase_idx': 1, 'active_cams': 4, 'intelligent_cams': 4}
+    stats_data = system.stats_manager.get_dashboard_data()
+    for h, w in GRID_SIZES:
+        grid = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+        results[f"draw_dashboard/{w}x{h}"] = measure(lambda: vis.draw_dashboard(grid, info, stats_data),
+                                                     repeat, budget)
+
+
+def bench_annotations(results, rng, repeat, budget, height=1080, width=1920):
+    """Cajas y etiquetas: redibujo por frame a resolución de cámara vs capa cacheada en el mosaico"""
+    tile = np.zeros((360, 480, 3), dtype=np.uint8)
+    scale = tile.shape[1] / width
+    for n in OBJECT_COUNTS:
+        boxes = synthetic_boxes(rng, n, height, width, size=120)
+        tracked = [[int(x), int(y), int(x2), int(y2), i] for i, (x, y, x2, y2) in enumerate(boxes)]
+        vehicle_data = {i: {'accumulated_time': float(rng.uniform(0, 60)),
+                            'incident_type': ('none', 'breakdown', 'collision')[i % 3]} for i in range(n)}
+        frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        layer = vis.AnnotationLayer()
+        key = ((height, width), tile.shape[:2])
+
+        def draw(canvas):
+            vis.draw_vehicle_boxes(canvas, tracked, vehicle_data, 30.0, scale)
+
+        results[f"annotations_draw/n={n}"] = measure(
+            lambda: vis.draw_vehicle_boxes(frame, tracked, vehicle_data, 30.0), repeat, budget)
+        results[f"annotations_rebuild/n={n}"] = measure(lambda: layer.rebuild(tracked, key, tile.shape, draw),
+                                                        repeat, budget)
+        results[f"annotations_composite/n={n}"] = measure(lambda: layer.composite(tile), repeat, budget)
+
+
+def bench_frame_pipeline(results, rng, repeat, budget, cameras=4):
+    """
+    Recorrido de un ciclo de display con 4 cámaras: captura, reducción para inferencia, mosaico
+    y lienzo del dashboard. 'alloc' reserva arreglos nuevos en cada paso (como antes del pool);
+    'pool' reutiliza los buffers de FramePool y escribe los mosaicos en el lienzo.
+    """
+    info = {'phase_idx': 1, 'active_cams': cameras, 'intelligent_cams': cameras}
+    stats_data = ({}, 0, 0, {})
+    for h, w in FRAME_SIZES:
+        sources = [rng.integers(0, 255, (h, w, 3), dtype=np.uint8) for _ in range(cameras)]
+        small_size = (int(w * 0.4), int(h * 0.4))
+
+        def step_alloc():
+            tiles = []
+            for src in sources:
+                frame = src.copy()  # cap.read() sin buffer entrega un arreglo nuevo
+                cv2.resize(frame, small_size)
+                tiles.append(cv2.resize(frame, (480, 360)))
+            grid = np.vstack([np.hstack(tiles[0:2]), np.hstack(tiles[2:4])])
+            vis.draw_dashboard(grid, info, stats_data)
+
+        pool = FramePool()
+        captures = [pool.acquire(('captura', i), (h, w, 3)) for i in range(cameras)]
+        canvas = pool.acquire('pantalla', (720, 960 + vis.DASHBOARD_MENU_W, 3))
+        grid_view = canvas.array[:, :960]
+        tile_views = [grid_view[r * 360:(r + 1) * 360, c * 480:(c + 1) * 480] for r in range(2) for c in range(2)]
+
+        def step_pool():
+            for i, src in enumerate(sources):
+                np.copyto(captures[i].array, src)  # cap.read(buffer) decodifica en el mismo arreglo
+                small = pool.acquire(('inferencia', i), (small_size[1], small_size[0], 3))
+                cv2.resize(captures[i].array, small_size, dst=small.array)
+                small.release()
+                cv2.resize(captures[i].array, (480, 360), dst=tile_views[i])
+            vis.draw_dashboard(grid_view, info, stats_data, canvas=canvas.array)
+
+        for name, step in (('alloc', step_alloc), ('pool', step_pool)):
+            case = f"frame_pipeline/{name}/{w}x{h}"
+            results[case] = measure(step, repeat, budget)
+            results[case]['alloc_kb'] = allocated_kb(step)
+
+
+def compare(results, baseline, threshold, metric):
+    """Lista de (caso, base, actual) que superan la tolerancia"""
+    regressions = []
+    for case, cur in results.items():
+        base = baseline.get(case)
+        if base is None or metric not in base:
+            continue
+        if cur[metric] > base[metric] * (1.0 + threshold):
+            regressions.append((case, base[metric], cur[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de AITRAFFIC")
+    parser.add_argument('--output', default="benchmark_results.json")
+    parser.add_argument('--baseline', default="benchmark_baseline.json")
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.25, help="Tolerancia relativa sobre la métrica")
+    parser.add_argument('--metric', default='median_us', choices=['min_us', 'median_us', 'p95_us', 'p99_us'],
+                        help="min_us es la más estable en equipos compartidos")
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--budget', type=float, default=1.0, help="Segundos máximos por caso")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+    rng = np.random.default_rng(0)
+    results = {}
+
+    # Todo lo que el sistema escriba en disco (CSV, evidencias) queda en un directorio temporal
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            system = build_system()
+            bench_tracker(results, rng, args.repeat, args.budget)
+            bench_zones(results, rng, args.repeat, args.budget)
+            bench_occupancy(results, rng, args.repeat, args.budget)
+            bench_vehicle_status(results, rng, args.repeat, args.budget, system)
+            bench_collisions(results, rng, args.repeat, args.budget, system)
+            bench_stats(results, args.repeat, args.budget, system)
+            bench_dashboard(results, rng, args.repeat, args.budget, system)
+            bench_annotations(results, rng, args.repeat, args.budget)
+            bench_frame_pipeline(results, rng, args.repeat, args.budget)
+        finally:
+            os.chdir(cwd)
+
+    print(f"\n{'CASO':<48}{'MIN (us)':>12}{'MEDIANA (us)':>14}{'P95 (us)':>12}{'P99 (us)':>12}{'RESERVA (KB)':>14}")
+    for case, r in results.items():
+        alloc = f"{r['alloc_kb']:>14.1f}" if 'alloc_kb' in r else f"{'-':>14}"
+        print(f"{case:<48}{r['min_us']:>12.1f}{r['median_us']:>14.1f}{r['p95_us']:>12.1f}{r['p99_us']:>12.1f}{alloc}")
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+    if args.update_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Línea base actualizada: {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"Sin línea base ({baseline_path}); ejecute con --update-baseline en el equipo de referencia.")
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.metric)
+    for case, base, cur in regressions:
+        print(f"❌ REGRESION {case}: {base:.1f}us -> {cur:.1f}us (+{(cur / base - 1) * 100:.0f}%)")
+    if regressions:
+        return 1
+    print(f"✅ Sin regresiones (tolerancia {args.threshold * 100:.0f}%)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
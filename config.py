@@ -62,9 +62,98 @@ PHASE_TIMES = {
     3: 20  # Sur
 }
 YELLOW_TIME = 3
+MIN_GREEN_TIME = 5  # Verde mínimo garantizado aunque la coordinación acorte la fase
 CAMERA_TIMEOUT = 20.0
 MAX_FAILURES = 5
 
+# Conexión / reconexión de cámaras (segundos)
+CAMERA_OPEN_TIMEOUT = 8.0  # Límite por cámara para abrir y leer el primer frame
+RECONNECT_BASE_DELAY = 1.0  # Backoff exponencial: 1, 2, 4, ... con jitter
+RECONNECT_MAX_DELAY = 60.0
+
+# --- TRAYECTORIAS Y VELOCIDAD ---
+TRAJECTORY_LENGTH = 16  # Centroides recientes guardados por vehículo (ring buffer)
+MAX_TRACKS = 128  # Vehículos simultáneos con historial por cámara
+SPEED_WINDOW = 4  # Muestras usadas para estimar velocidad y rumbo
+STOP_SPEED = 0.8  # m/s: por debajo se considera detenido (solo cámaras con homografía)
+
+# --- SALIDA A SEMÁFOROS ---
+SIGNAL_DRIVER = 'simulated'  # 'simulated' (gabinete local), 'serial' o None (solo pantalla)
+SIGNAL_SERIAL_PORT = "/dev/ttyUSB0"
+SIGNAL_SERIAL_BAUD = 9600
+SIGNAL_TICK = 0.02  # Segundos por tick del hilo de temporización
+ALL_RED_TIME = 1.0  # Despeje en rojo total antes de dar verde a un grupo en conflicto
+
+# --- CALIDAD DE SERVICIO (LATENCIA) ---
+# Niveles de degradación por cámara: el 0 es el nominal. Se baja de nivel cuando la edad
+# captura -> decisión supera el objetivo y se vuelve a subir cuando sobra margen.
+QOS_LEVELS = [
+    {'scale': 0.4, 'interval': 5, 'render_every': 1},
+    {'scale': 0.33, 'interval': 6, 'render_every': 2},
+    {'scale': 0.25, 'interval': 8, 'render_every': 3},
+    {'scale': 0.2, 'interval': 12, 'render_every': 4},
+]
+QOS_TARGET_AGE = 0.5  # Segundos: p90 máximo de la edad captura -> decisión
+QOS_WINDOW = 8  # Decisiones por ventana de evaluación
+QOS_HEADROOM = 0.5  # Subir de nivel solo si el p90 queda bajo esta fracción del objetivo...
+QOS_UPGRADE_WINDOWS = 5  # ...durante estas ventanas seguidas
+
+# --- OCUPACIÓN POR CARRIL ---
+OCCUPANCY_CELL = 16  # Píxeles por celda de la rejilla de ocupación
+OCCUPANCY_HALF_LIFE = 2.0  # Segundos: vida media del decaimiento exponencial
+OCCUPANCY_PRESENCE = 0.2  # Ocupación de la celda más ocupada para considerar que hay vehículos
+OCCUPANCY_QUEUE_LEVEL = 0.5  # Ocupación media de fila que cuenta como cola
+OCCUPANCY_STOP_LINE = 'bottom'  # Borde de la zona donde está la línea de alto ('bottom' o 'top')
+SHOW_OCCUPANCY_HEATMAP = True
+
+# Homografía imagen -> suelo (metros) por cámara, obtenida al calibrar con 4+ puntos de referencia
+# (cv2.findHomography). None = sin calibrar: se usa el umbral de detención en píxeles.
+CAMERA_HOMOGRAPHIES = {
+    NORTE_IDX: None,
+    SUR_IDX: None,
+    ESTE_IDX: None,
+    OESTE_IDX: None
+}
+
+# --- CONECTIVIDAD ---
+WEBHOOK_URL = "https://n8n.trazo.xyz/webhook/sendMessageImg"  # Alertas con evidencia (una por incidente)
+TELEMETRY_URL = None  # Endpoint del uplink de telemetría (None = deshabilitado)
+TELEMETRY_INTERVAL = 60.0  # Segundos por lote
+TELEMETRY_SPOOL_DIR = "telemetria_spool"  # Cola en disco mientras no hay enlace
+TELEMETRY_MAX_RATE = 2.0  # Lotes por segundo al vaciar la cola
+TELEMETRY_MAX_SPOOL_MB = 50
+
+# --- COORDINACIÓN DE CORREDOR (ONDA VERDE) ---
+COORDINATION_ENABLED = False
+COORDINATION_NODE_ID = "interseccion-01"
+COORDINATION_PORT = 47800
+COORDINATION_MULTICAST_GROUP = "239.255.47.80"  # None = unicast a COORDINATION_PEERS
+COORDINATION_PEERS = []  # [("10.0.0.12", 47800), ...] solo en modo unicast
+COORDINATION_UPSTREAM = {}  # {"interseccion-00": 18.0} -> tiempo de viaje (s) desde el vecino
+COORDINATED_PHASE = 1  # Rectos E-O: la fase que forma la onda verde
+COORDINATION_MAX_SHIFT = 5.0  # Ajuste máximo por ciclo (s)
+COORDINATION_PEER_TIMEOUT = 3.0  # Sin mensajes en este tiempo -> control autónomo
+
+# --- DIAGNÓSTICO ---
+# Perfilador: `kill -USR1 <pid>` o `curl "http://127.0.0.1:47990/profile?seconds=10"`
+PROFILER_PORT = 47990  # Endpoint local de control (None = solo por señal)
+PROFILER_DEFAULT_SECONDS = 10
+PROFILER_MAX_SECONDS = 120  # Tope por captura (el endpoint recorta valores mayores)
+PROFILER_INTERVAL = 0.005  # Segundos entre muestras
+PROFILER_DIR = "perfiles"
+
+# --- REINICIO EN CALIENTE ---
+ZONES_FILE = "zonas.json"  # Zonas editadas en vivo (tienen prioridad sobre las de este archivo)
+STATE_FILE = "estado_runtime.json"
+STATE_SAVE_INTERVAL = 5.0  # Segundos entre snapshots
+STATE_MAX_AGE = 300.0  # Snapshots más viejos se ignoran al arrancar
+
+
+# Función helper para obtener la homografía de una cámara
+def get_homography(channel_idx):
+    H = CAMERA_HOMOGRAPHIES.get(channel_idx)
+    return np.array(H, dtype=np.float64) if H is not None else None
+
 
 # Función helper para obtener zonas según el canal
 def get_zones(channel_idx):
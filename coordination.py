@@ -0,0 +1,210 @@
+import collections
+import json
+import socket
+import struct
+import threading
+import time
+
+# Campos que cada tipo de mensaje necesita; un paquete sin ellos se descarta
+REQUIRED_KEYS = {
+    'ping': ('t0',),
+    'pong': ('to', 't0', 't1', 't2'),
+    'phase': ('seq', 'phase', 'start', 'sent'),
+}
+
+
+class CorridorBus:
+    """
+    Bus de mensajes entre intersecciones vecinas sobre UDP.
+
+    Con multicast_group todos los nodos comparten un grupo multicast; sin él se envía por
+    unicast a la lista de peers (útil como sustituto de broker en pruebas locales).
+    Cada nodo publica sus inicios de fase y su demanda, y estima el desfase de reloj de cada
+    vecino con intercambios ping/pong tipo NTP para traducir sus tiempos al reloj local.
+    """
+
+    def __init__(self, node_id, port, peers=(), multicast_group=None, peer_timeout=3.0, ping_interval=1.0,
+                 coordinated_phase=1, clock=time.time):
+        self.node_id = node_id
+        self.peer_timeout = peer_timeout
+        self.ping_interval = ping_interval
+        self.coordinated_phase = coordinated_phase
+        self.clock = clock
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if multicast_group:
+            self.sock.bind(('', port))
+            mreq = struct.pack('4sl', socket.inet_aton(multicast_group), socket.INADDR_ANY)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            self.targets = [(multicast_group, port)]
+        else:
+            self.sock.bind(('0.0.0.0', port))
+            self.targets = [tuple(p) for p in peers]
+        self.sock.settimeout(0.2)
+
+        self.peers = {}
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.last_phase_msg = None
+        self.running = False
+        self.threads = []
+
+    # --- ENVÍO ---
+    def _send(self, msg, addr=None):
+        data = json.dumps(msg, separators=(',', ':')).encode('utf-8')
+        for target in ([addr] if addr else self.targets):
+            try:
+                self.sock.sendto(data, target)
+            except OSError:
+                pass
+
+    def publish_phase(self, phase, phase_start, demand):
+        """Anuncia un inicio de fase (en reloj local) y la demanda estimada hacia aguas abajo"""
+        with self.lock:
+            self.seq += 1
+            self.last_phase_msg = {'type': 'phase', 'node': self.node_id, 'seq': self.seq, 'phase': phase,
+                                   'start': phase_start, 'demand': demand}
+            msg = dict(self.last_phase_msg, sent=self.clock())
+        self._send(msg)
+
+    # --- RECEPCIÓN ---
+    def _peer(self, node):
+        if node not in self.peers:
+            self.peers[node] = {'last_seen': 0.0, 'samples': collections.deque(maxlen=8), 'offset': 0.0,
+                                'rtt': None, 'latency': None, 'phase': None, 'coord_start': None,
+                                'coord_seq': None, 'period': None, 'demand': 0}
+        return self.peers[node]
+
+    def _handle(self, msg, addr, recv_time):
+        if not isinstance(msg, dict):
+            return
+        node = msg.get('node')
+        if node is None or node == self.node_id:
+            return
+        kind = msg.get('type')
+        if any(k not in msg for k in REQUIRED_KEYS.get(kind, ())):
+            return
+
+        if kind == 'ping':
+            self._send({'type': 'pong', 'node': self.node_id, 'to': node, 't0': msg['t0'], 't1': recv_time,
+                        't2': self.clock()}, addr)
+            return
+
+        with self.lock:
+            peer = self._peer(node)
+            peer['last_seen'] = recv_time
+
+            if kind == 'pong' and msg.get('to') == self.node_id:
+                t0, t1, t2, t3 = msg['t0'], msg['t1'], msg['t2'], recv_time
+                rtt = (t3 - t0) - (t2 - t1)
+                peer['samples'].append((rtt, ((t1 - t0) + (t2 - t3)) / 2.0))
+                # La muestra con menor RTT es la menos afectada por colas de red
+                best_rtt, best_offset = min(peer['samples'])
+                peer['rtt'], peer['offset'] = best_rtt, best_offset
+
+            elif kind == 'phase':
+                offset = peer['offset']
+                peer['latency'] = recv_time - (msg['sent'] - offset)
+                peer['demand'] = msg.get('demand', 0)
+                start_local = msg['start'] - offset
+                if msg['phase'] == self.coordinated_phase:
+                    # Los latidos repiten el mismo seq: solo un seq nuevo es un nuevo inicio de fase
+                    if msg['seq'] != peer['coord_seq'] and peer['coord_start'] is not None:
+                        peer['period'] = start_local - peer['coord_start']
+                    peer['coord_start'] = start_local
+                    peer['coord_seq'] = msg['seq']
+                peer['phase'] = msg['phase']
+
+    def _receive_loop(self):
+        while self.running:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            recv_time = self.clock()
+            try:
+                msg = json.loads(data.decode('utf-8'))
+                self._handle(msg, addr, recv_time)
+            except (KeyError, TypeError, ValueError) as e:
+                # Un paquete ajeno o mal formado en el grupo no debe detener la recepción
+                print(f"[CORREDOR] Mensaje descartado de {addr[0]}: {e!r}")
+
+    def _ping_loop(self):
+        while self.running:
+            self._send({'type': 'ping', 'node': self.node_id, 't0': self.clock()})
+            # Latido: repetir el último estado de fase para que los vecinos sepan que seguimos vivos
+            with self.lock:
+                last = dict(self.last_phase_msg, sent=self.clock()) if self.last_phase_msg else None
+            if last:
+                self._send(last)
+            time.sleep(self.ping_interval)
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self._receive_loop, name="bus-rx", daemon=True),
+                        threading.Thread(target=self._ping_loop, name="bus-ping", daemon=True)]
+        for t in self.threads: t.start()
+
+    def stop(self):
+        self.running = False
+        for t in self.threads: t.join(1.0)
+        self.sock.close()
+
+    # --- CONSULTA ---
+    def live_peer(self, node):
+        """Estado del vecino o None si lleva más de peer_timeout sin mensajes"""
+        with self.lock:
+            peer = self.peers.get(node)
+            if peer is None or self.clock() - peer['last_seen'] > self.peer_timeout:
+                return None
+            return {k: v for k, v in peer.items() if k != 'samples'}
+
+
+class GreenWaveCoordinator:
+    """
+    Calcula cuánto alargar o acortar la fase previa a la fase coordinada para que ésta
+    arranque cuando llega el pelotón del vecino aguas arriba (inicio del vecino + tiempo de viaje).
+    Sin vecinos vivos el ajuste es 0 (control autónomo).
+    """
+
+    def __init__(self, bus, upstream, cycle_time, max_shift, min_duration):
+        self.bus = bus
+        self.upstream = upstream  # {node_id: tiempo_de_viaje_s}
+        self.cycle_time = cycle_time
+        self.max_shift = max_shift
+        self.min_duration = min_duration
+        self.standalone = True
+
+    def adjustment(self, phase_start, nominal_duration):
+        best = None
+        for node, travel in self.upstream.items():
+            peer = self.bus.live_peer(node)
+            if peer is None or peer['coord_start'] is None:
+                continue
+            if best is None or peer['demand'] > best[0]['demand']:
+                best = (peer, travel)
+
+        if best is None:
+            if not self.standalone:
+                print("[CORREDOR] ⚠️ Vecinos sin señal: control autónomo.")
+            self.standalone = True
+            return 0.0
+        if self.standalone:
+            print("[CORREDOR] ✅ Coordinando con vecinos (onda verde).")
+        self.standalone = False
+
+        peer, travel = best
+        period = peer['period'] if peer['period'] and peer['period'] > 0 else self.cycle_time
+        natural = phase_start + nominal_duration
+        # Llegada del pelotón más cercana al inicio natural de la fase coordinada
+        arrival = peer['coord_start'] + travel
+        k = round((natural - arrival) / period)
+        delta = arrival + k * period - natural
+
+        delta = max(-self.max_shift, min(self.max_shift, delta))
+        return max(delta, self.min_duration - nominal_duration)
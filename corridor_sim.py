@@ -0,0 +1,225 @@
+"""
+Simulación local de un corredor de intersecciones coordinadas.
+
+Cada intersección corre en su propio proceso un TrafficLightSystem sin servicios ni modelo, con su
+propio reloj desfasado. El bus de corredor (UDP unicast en localhost) y el coordinador se inyectan
+en el sistema, y las fases las decide el control adaptativo real (intelligent_control_step ->
+compute_phase_duration -> precedes_coordinated). Los nodos pares no tienen demanda en las flechas,
+así que saltan la fase 0 y el ajuste lo hace la fase 3; los impares saltan la fase 2 (Norte).
+
+Los tiempos de fase están escalados para que la prueba dure segundos. La ventana de convergencia
+se calcula a partir de MAX_SHIFT y del ciclo, de modo que el veredicto no depende de cuánto dure la
+corrida. Después de medir, una intersección se queda en silencio para verificar que la siguiente
+vuelve a control autónomo.
+
+Uso:
+    python corridor_sim.py --nodes 5
+    python -m pytest -m slow tests/test_corridor.py
+"""
+import argparse
+import math
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import config as cfg
+from coordination import CorridorBus, GreenWaveCoordinator
+from detector import VehicleDetector
+from main import TrafficLightSystem
+
+# Tiempos escalados (s). La fase 0 y la 2 duran lo mismo para que el ciclo efectivo sea igual
+# en todos los nodos aunque cada uno salte una distinta.
+PHASE_TIMES = {0: 0.6, 1: 0.8, 2: 0.6, 3: 0.6}
+YELLOW_TIME = 0.1
+MIN_GREEN_TIME = 0.2
+CYCLE = sum(PHASE_TIMES.values()) - PHASE_TIMES[0]
+TRAVEL_TIME = 0.7  # Tiempo de viaje entre intersecciones consecutivas (no múltiplo del ciclo)
+MAX_SHIFT = 0.4
+PEER_TIMEOUT = 1.0
+CONTROL_PERIOD = 0.002
+DETECTION_PERIOD = 0.2
+
+
+def convergence_cycles(n_nodes):
+    """
+    Ciclos hasta que el último nodo queda en fase: cada enlace cierra a lo sumo medio ciclo de
+    desfase a razón del ajuste máximo por ciclo (acotado al acortar por el verde mínimo), y en el
+    peor caso los enlaces convergen uno tras otro. Se suman ciclos para estimar reloj y período.
+    """
+    min_duration = YELLOW_TIME + MIN_GREEN_TIME
+    step = min(MAX_SHIFT, min(PHASE_TIMES[0], PHASE_TIMES[3]) - min_duration)
+    return (n_nodes - 1) * math.ceil((CYCLE / 2) / step) + 3
+
+
+def lane_boxes(skip_phase):
+    """Una caja detenida en el centro de cada carril con demanda, por canal; sin demanda para `skip_phase`"""
+    boxes = {}
+    for i, ch in enumerate(cfg.CAMERA_CHANNELS):
+        main_zones, arrow_zones = cfg.get_zones(i)
+        zones = list(main_zones) + list(arrow_zones)
+        if skip_phase == 0:
+            zones = list(main_zones)
+        elif skip_phase == 2 and i == cfg.NORTE_IDX:
+            zones = []
+        rects = []
+        for zone in zones:
+            cx, cy = np.asarray(zone).mean(axis=0).astype(int)
+            rects.append([cx - 20, cy - 15, cx + 20, cy + 15])
+        boxes[ch] = rects
+    return boxes
+
+
+def run_node(idx, n_nodes, base_port, duration, skew, silence_after, ready, out_q):
+    # Tiempos escalados en el config de este proceso, antes de construir el sistema
+    cfg.PHASE_TIMES = dict(PHASE_TIMES)
+    cfg.YELLOW_TIME = YELLOW_TIME
+    cfg.MIN_GREEN_TIME = MIN_GREEN_TIME
+    # El registro CSV y zonas.json se resuelven en el directorio actual
+    os.chdir(tempfile.mkdtemp(prefix=f"corredor-{idx}-"))
+
+    clock = lambda: time.time() + skew
+    peers = [('127.0.0.1', base_port + j) for j in (idx - 1, idx + 1) if 0 <= j < n_nodes]
+    bus = CorridorBus(f"nodo-{idx}", base_port + idx, peers=peers, peer_timeout=PEER_TIMEOUT, ping_interval=0.2,
+                      coordinated_phase=cfg.COORDINATED_PHASE, clock=clock)
+    upstream = {f"nodo-{idx - 1}": TRAVEL_TIME} if idx > 0 else {}
+
+    system = TrafficLightSystem(detector=VehicleDetector(load=False), start_services=False)
+    system.corridor_bus = bus
+    system.coordinator = GreenWaveCoordinator(bus, upstream, sum(cfg.PHASE_TIMES.values()), MAX_SHIFT,
+                                              cfg.YELLOW_TIME + cfg.MIN_GREEN_TIME)
+    bus.start()
+
+    # Pares: sin flechas (salta la fase 0). Impares: sin Norte (salta la fase 2).
+    boxes = lane_boxes(skip_phase=0 if idx % 2 == 0 else 2)
+    # Arranque en un punto al azar del ciclo: sin coordinación los nodos quedan desfasados
+    random.seed(idx)
+    system.current_phase = random.randrange(4)
+    system.phase_duration = cfg.PHASE_TIMES[system.current_phase]
+    system.phase_start_time = clock() - random.uniform(0, system.phase_duration)
+
+    # Todos los nodos arrancan juntos, una vez construidos (importar main toma su tiempo)
+    ready.wait()
+    t_start = time.time()
+    silence_at = t_start + silence_after if silence_after is not None else None
+    silenced = False
+    last_start = None
+    next_detection = 0.0
+    next_latency_sample = t_start + 1.0
+    t_end = t_start + duration
+    while time.time() < t_end:
+        if silence_at is not None and not silenced and time.time() >= silence_at:
+            bus.stop()
+            system.corridor_bus = None
+            silenced = True
+
+        now = clock()
+        if now >= next_detection:
+            for ch, rects in boxes.items():
+                system.process_detections(ch, rects, None, now=now)
+            next_detection = now + DETECTION_PERIOD
+        system.intelligent_control_step(now=now)
+        if system.current_phase == cfg.COORDINATED_PHASE and system.phase_start_time != last_start:
+            last_start = system.phase_start_time
+            out_q.put(('start', idx, last_start - skew))  # En tiempo real, no en el reloj del nodo
+
+        if upstream and time.time() >= next_latency_sample:
+            peer = bus.live_peer(f"nodo-{idx - 1}")
+            if peer is not None and peer['latency'] is not None:
+                out_q.put(('latency', idx, peer['latency']))
+            next_latency_sample += 1.0
+        time.sleep(CONTROL_PERIOD)
+
+    out_q.put(('standalone', idx, system.coordinator.standalone))
+    if not silenced:
+        bus.stop()
+
+
+def offset_errors(starts_up, starts_down, t_from, t_to):
+    """Error entre cada inicio aguas abajo y la llegada del pelotón más cercano"""
+    arrivals = [s + TRAVEL_TIME for s in starts_up]
+    errors = []
+    for s in starts_down:
+        if t_from <= s <= t_to and arrivals:
+            errors.append(min((s - a for a in arrivals), key=abs))
+    return errors
+
+
+def run_corridor(n_nodes=5, base_port=47900, eval_cycles=5, tolerance=0.1):
+    """Corre la simulación completa; imprime el reporte y retorna True si todo pasó"""
+    settle = convergence_cycles(n_nodes) * CYCLE
+    measure = eval_cycles * CYCLE
+    fallback = PEER_TIMEOUT + 2 * CYCLE
+    duration = settle + measure + fallback
+
+    silent_node = n_nodes // 2
+    print(f"[CORREDOR] {n_nodes} nodos: convergencia {settle:.1f} s, medición {measure:.1f} s, "
+          f"total {duration:.1f} s")
+    out_q = mp.Queue()
+    ready = mp.Barrier(n_nodes + 1)
+    procs = []
+    for i in range(n_nodes):
+        skew = random.uniform(-0.5, 0.5)  # Relojes desalineados a propósito
+        p = mp.Process(target=run_node, args=(i, n_nodes, base_port, duration, skew,
+                                               settle + measure if i == silent_node else None, ready, out_q))
+        p.start()
+        procs.append(p)
+    ready.wait(timeout=60)
+    t0 = time.time()
+    silence_at = t0 + settle + measure
+
+    starts = {i: [] for i in range(n_nodes)}
+    latencies = []
+    standalone = {}
+    while len(standalone) < n_nodes:
+        kind, idx, value = out_q.get(timeout=duration + 30)
+        if kind == 'start':
+            starts[idx].append(value)
+        elif kind == 'latency':
+            latencies.append(value)
+        elif kind == 'standalone':
+            standalone[idx] = value
+    for p in procs: p.join()
+
+    ok = True
+    print(f"\n=== CORREDOR DE {n_nodes} INTERSECCIONES ===")
+    for i in range(1, n_nodes):
+        errors = offset_errors(starts[i - 1], starts[i], t0 + settle, silence_at)
+        mean_err = sum(abs(e) for e in errors) / len(errors) if errors else float('inf')
+        link_ok = mean_err <= tolerance
+        ok &= link_ok
+        print(f"nodo-{i - 1} -> nodo-{i}: error medio de desfase {mean_err * 1000:.0f} ms "
+              f"({len(errors)} ciclos) {'OK' if link_ok else 'FALLA'}")
+
+    if latencies:
+        latencies.sort()
+        p99 = latencies[int(0.99 * (len(latencies) - 1))]
+        print(f"Latencia del bus: mediana {latencies[len(latencies) // 2] * 1000:.1f} ms | p99 {p99 * 1000:.1f} ms")
+        ok &= p99 < 0.1
+
+    follower = silent_node + 1
+    if follower < n_nodes:
+        fallback_ok = standalone.get(follower, False)
+        ok &= fallback_ok
+        print(f"nodo-{silent_node} en silencio -> nodo-{follower} autónomo: {'OK' if fallback_ok else 'FALLA'}")
+
+    print("RESULTADO:", "OK" if ok else "FALLA")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulación de corredor con onda verde")
+    parser.add_argument('--nodes', type=int, default=5)
+    parser.add_argument('--eval-cycles', type=int, default=5, help="Ciclos medidos tras la convergencia")
+    parser.add_argument('--base-port', type=int, default=47900)
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Error medio máximo de desfase (s)")
+    args = parser.parse_args()
+    ok = run_corridor(args.nodes, args.base_port, args.eval_cycles, args.tolerance)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
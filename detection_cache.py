@@ -0,0 +1,127 @@
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b'AITDET02'  # 02: la cámara se graba como índice, no como canal
+HEADER_LEN = struct.Struct('<I')
+
+# Un registro por detección (20 bytes). Un ciclo de detección sin vehículos se guarda igual,
+# con conf = EMPTY_CONF, para que la repetición también vacíe el tracker en ese instante.
+# La cámara se guarda como índice en la lista 'cameras' de la cabecera: la fuente puede ser
+# un número de dispositivo o una URL (RTSP) y no cabe en el registro.
+RECORD_DTYPE = np.dtype([('frame', '<u4'), ('t', '<f4'), ('camera', '<u2'), ('conf', '<f2'),
+                         ('box', '<i2', (4,))])
+EMPTY_CONF = -1.0
+
+
+class DetectionRecorder:
+    """
+    Graba cada salida del detector en un archivo binario compacto de solo-anexado.
+
+    Cabecera: MAGIC + longitud u32 + JSON (cámaras como [{'source', 'name'}, ...], hora de inicio...).
+    Después, registros RECORD_DTYPE con el índice de frame, segundos desde el inicio, índice de
+    cámara, confianza y caja [x, y, x2, y2] en coordenadas del frame original.
+    """
+
+    def __init__(self, path, meta=None, flush_every=200):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.start_time = time.time()
+        self.flush_every = flush_every
+        self.pending = 0
+        self.records = 0
+
+        header = json.dumps(dict(meta or {}, start_time=self.start_time), separators=(',', ':')).encode('utf-8')
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + HEADER_LEN.pack(len(header)) + header)
+
+    def record(self, frame_idx, camera, boxes, scores, timestamp=None):
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        t = (timestamp if timestamp is not None else time.time()) - self.start_time
+        n = max(len(boxes), 1)
+        rows = np.zeros(n, dtype=RECORD_DTYPE)
+        rows['frame'] = frame_idx
+        rows['t'] = t
+        rows['camera'] = camera
+        if len(boxes) > 0:
+            rows['conf'] = np.asarray(scores, dtype=np.float32).reshape(-1)
+            rows['box'] = np.clip(boxes, -32768, 32767)
+        else:
+            rows['conf'] = EMPTY_CONF
+        self.file.write(rows.tobytes())
+        self.records += n
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.file.flush()
+            self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.flush()
+            self.file.close()
+            self.file = None
+
+
+class DetectionCache:
+    """
+    Lectura de un archivo de DetectionRecorder vía np.memmap (sin cargarlo en memoria).
+
+    Un registro final a medio escribir (corte durante la grabación) se ignora.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} no es una caché de detecciones")
+            (length,) = HEADER_LEN.unpack(f.read(HEADER_LEN.size))
+            self.meta = json.loads(f.read(length).decode('utf-8'))
+        offset = len(MAGIC) + HEADER_LEN.size + length
+        count = (os.path.getsize(path) - offset) // RECORD_DTYPE.itemsize
+        if count > 0:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=offset, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+        # Inicio de cada grupo (frame, cámara); los registros se escriben en orden
+        if count > 0:
+            frames = self.records['frame']
+            cameras = self.records['camera']
+            change = (frames[1:] != frames[:-1]) | (cameras[1:] != cameras[:-1])
+            self.group_starts = np.concatenate([[0], np.flatnonzero(change) + 1, [count]])
+        else:
+            self.group_starts = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.group_starts) - 1
+
+    @property
+    def duration(self):
+        return float(self.records['t'][-1]) if len(self.records) else 0.0
+
+    @property
+    def sources(self):
+        """Fuente de video (canal o URL) de cada índice de cámara grabado"""
+        return [cam['source'] for cam in self.meta.get('cameras', [])]
+
+    def groups(self, min_conf=0.0):
+        """
+        Itera (frame, t, índice de cámara, cajas) en orden de grabación, con cajas [[x, y, x2, y2], ...]
+        filtradas por confianza. t es relativo al inicio de la grabación.
+        """
+        starts = self.group_starts
+        heads = starts[:-1]
+        frames = self.records['frame'][heads].tolist()
+        times = self.records['t'][heads].tolist()
+        cameras = self.records['camera'][heads].tolist()
+        # Vista ndarray del memmap: evita el costo de memmap.__getitem__ por grupo
+        data = self.records.view(np.ndarray)
+        boxes, keep = data['box'], data['conf'] >= max(min_conf, 0.0)
+        for i in range(len(heads)):
+            a, b = starts[i], starts[i + 1]
+            yield frames[i], times[i], cameras[i], boxes[a:b][keep[a:b]].tolist()
@@ -5,9 +5,11 @@ import matplotlib.path as mplPath
 
 
 class VehicleDetector:
-    def __init__(self):
+    def __init__(self, load=True):
         self.model = None
-        self.load_model()
+        # load=False: sin modelo (benchmarks, simulaciones y repeticiones desde caché)
+        if load:
+            self.load_model()
 
     def load_model(self):
         try:
@@ -31,9 +33,36 @@ class VehicleDetector:
                 return True
         return False
 
+    def compile_zone(self, zone):
+        """Precompila un polígono de zona (None si está vacío)"""
+        return mplPath.Path(zone) if len(zone) > 0 else None
+
+    def points_in_zones(self, points, zones):
+        """
+        Versión vectorizada de is_valid_detection: evalúa un arreglo (N, 2) de centros a la vez.
+        Las zonas pueden ser polígonos o rutas ya compiladas con compile_zone().
+        """
+        points = np.asarray(points).reshape(-1, 2)
+        inside = np.zeros(len(points), dtype=bool)
+        if len(points) == 0:
+            return inside
+        for zone in zones:
+            if zone is None:
+                continue
+            if isinstance(zone, mplPath.Path):
+                inside |= zone.contains_points(points)
+            elif len(zone) > 0:
+                inside |= mplPath.Path(zone).contains_points(points)
+        return inside
+
     def detect(self, frame):
+        boxes, _ = self.detect_with_scores(frame)
+        return boxes
+
+    def detect_with_scores(self, frame):
+        """Como detect(), pero retorna también la confianza de cada caja: (cajas (N, 4), confianzas (N,))"""
         if self.model is None:
-            return []
+            return [], []
 
         height, width = frame.shape[:2]
         scale = 0.5
@@ -47,4 +76,4 @@ class VehicleDetector:
         df = preds.pandas().xyxy[0]
         df = df[df["confidence"] >= 0.2]
         df = df[df["name"].isin(["car", "truck", "bus", "motorcycle"])]
-        return df[["xmin", "ymin", "xmax", "ymax"]].values.astype(int)
\ No newline at end of file
+        return df[["xmin", "ymin", "xmax", "ymax"]].values.astype(int), df["confidence"].values.astype(np.float32)
\ No newline at end of file
@@ -0,0 +1,77 @@
+import threading
+
+import numpy as np
+
+
+class FrameBuffer:
+    """Arreglo reutilizable con conteo de referencias; al llegar a cero vuelve a su pool"""
+
+    def __init__(self, pool, key, array):
+        self.pool = pool
+        self.key = key
+        self.array = array
+        self.refs = 0
+
+    def retain(self):
+        with self.pool.lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        self.pool._release(self)
+
+
+class FramePool:
+    """
+    Pool de buffers de frame por (uso/cámara, resolución).
+
+    acquire() entrega un buffer libre de esa forma o reserva uno nuevo si todos están en uso.
+    Quien lo comparte con otro hilo llama retain(); cada dueño llama release() al terminar.
+    Se guardan hasta `max_free` buffers libres por clave; el resto se suelta.
+    """
+
+    def __init__(self, max_free=2):
+        self.max_free = max_free
+        self.lock = threading.Lock()
+        self.free = {}
+        self.acquired = 0
+        self.allocated = 0
+        self.allocated_bytes = 0
+        self.in_use = 0
+
+    def acquire(self, name, shape, dtype=np.uint8):
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            self.acquired += 1
+            self.in_use += 1
+            free = self.free.get(key)
+            if free:
+                buf = free.pop()
+                buf.refs = 1
+                return buf
+            self.allocated += 1
+        array = np.empty(shape, dtype=dtype)
+        with self.lock:
+            self.allocated_bytes += array.nbytes
+        buf = FrameBuffer(self, key, array)
+        buf.refs = 1
+        return buf
+
+    def _release(self, buf):
+        with self.lock:
+            buf.refs -= 1
+            if buf.refs > 0:
+                return
+            if buf.refs < 0:
+                raise RuntimeError("FrameBuffer liberado más veces de las retenidas")
+            self.in_use -= 1
+            free = self.free.setdefault(buf.key, [])
+            if len(free) < self.max_free:
+                free.append(buf)
+
+    def stats(self):
+        with self.lock:
+            hits = self.acquired - self.allocated
+            return {'acquired': self.acquired, 'allocated': self.allocated,
+                    'allocated_mb': self.allocated_bytes / 1e6, 'in_use': self.in_use,
+                    'hit_rate': hits / self.acquired if self.acquired else 0.0}
@@ -0,0 +1,228 @@
+"""
+Generador de carga sintética para dimensionar hardware sin modelo ni cámaras.
+
+Produce flujos de cajas realistas por canal (llegadas Poisson, vehículos detenidos,
+choques y pérdidas de detección) y los inyecta directamente en la ruta posterior a la
+detección (TrafficLightSystem.process_detections), más el paso del control adaptativo.
+Todo corre con un reloj simulado: cada tick avanza `--dt` segundos del mundo, así que
+el tiempo de pared solo mide el costo de Python (tracking, zonas, incidentes, control,
+estadísticas), sin el de la inferencia.
+
+Reporta los ticks por segundo sostenibles y el crecimiento de memoria (RSS) de la corrida.
+
+Uso:
+    python loadgen.py --channels 64 --vehicles 30 --duration 60
+    python loadgen.py --channels 4,16,64,128 --duration 20    # barrido
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import config as cfg
+from detector import VehicleDetector
+
+FRAME_W, FRAME_H = 640, 480  # Resolución a la que están definidas las zonas
+
+
+class SyntheticCamera:
+    """
+    Mundo sintético de una cámara: vehículos que entran por arriba y bajan atravesando la zona.
+
+    Una fracción se detiene dentro de la zona (avería) durante stall_time segundos y, cada tanto,
+    se genera un par de vehículos detenidos a menos de la distancia de choque (choque). Las cajas
+    salen con ruido de posición y una probabilidad de no ser detectadas, como las del modelo real.
+    """
+
+    def __init__(self, rng, zone, collision_dist, max_vehicles=30, arrival_rate=1.0, stalled_fraction=0.05,
+                 collision_rate=0.01, stall_time=300.0, miss_rate=0.03, noise=2.0):
+        self.rng = rng
+        self.collision_dist = collision_dist
+        self.max_vehicles = max_vehicles
+        self.arrival_rate = arrival_rate
+        self.stalled_fraction = stalled_fraction
+        self.collision_rate = collision_rate
+        self.stall_time = stall_time
+        self.miss_rate = miss_rate
+        self.noise = noise
+
+        zone = np.asarray(zone, dtype=float)
+        self.x_min, self.y_min = zone.min(axis=0)
+        self.x_max, self.y_max = zone.max(axis=0)
+
+        self.pos = np.empty((0, 2))
+        self.vel = np.empty((0, 2))
+        self.size = np.empty((0, 2))
+        self.stop_y = np.empty(0)  # Altura a la que se detiene (inf = no se detiene)
+        self.stall_left = np.empty(0)  # Segundos que le quedan detenido (retiro de la grúa)
+
+    def _spawn(self, n, stop_y=None, x=None):
+        if n <= 0:
+            return
+        xs = x if x is not None else self.rng.uniform(self.x_min, self.x_max, n)
+        pos = np.stack([xs, np.full(n, -20.0)], axis=1)
+        vel = np.stack([self.rng.normal(0, 3, n), self.rng.uniform(40, 120, n)], axis=1)  # px/s
+        size = np.stack([self.rng.uniform(40, 90, n), self.rng.uniform(35, 70, n)], axis=1)
+        if stop_y is None:
+            stalled = self.rng.random(n) < self.stalled_fraction
+            stop_y = np.where(stalled, self.rng.uniform(self.y_min, self.y_max, n), np.inf)
+        self.pos = np.concatenate([self.pos, pos])
+        self.vel = np.concatenate([self.vel, vel])
+        self.size = np.concatenate([self.size, size])
+        self.stop_y = np.concatenate([self.stop_y, stop_y])
+        self.stall_left = np.concatenate([self.stall_left, np.full(n, self.stall_time)])
+
+    def step(self, dt):
+        """Avanza el mundo dt segundos y retorna las cajas detectadas [[x, y, x2, y2], ...]"""
+        free = self.max_vehicles - len(self.pos)
+        self._spawn(min(free, self.rng.poisson(self.arrival_rate * dt)))
+        if len(self.pos) + 2 <= self.max_vehicles and self.rng.random() < self.collision_rate * dt:
+            # Dos vehículos que quedan detenidos uno junto al otro
+            x = self.rng.uniform(self.x_min, max(self.x_min, self.x_max - 60))
+            y = self.rng.uniform(self.y_min, self.y_max)
+            self._spawn(2, stop_y=np.array([y, y + self.collision_dist * 0.5]), x=np.array([x, x + 10.0]))
+
+        moving = self.pos[:, 1] < self.stop_y
+        self.pos[moving] += self.vel[moving] * dt
+        stopped = self.pos[:, 1] >= self.stop_y
+        self.pos[stopped, 1] = self.stop_y[stopped]
+        self.stall_left[stopped] -= dt
+        # Pasado stall_time el vehículo retoma la marcha y libera la escena
+        self.stop_y[stopped & (self.stall_left <= 0)] = np.inf
+
+        alive = (self.pos[:, 1] < FRAME_H + 50) & (self.pos[:, 0] > -100) & (self.pos[:, 0] < FRAME_W + 100)
+        self.pos, self.vel = self.pos[alive], self.vel[alive]
+        self.size, self.stop_y, self.stall_left = self.size[alive], self.stop_y[alive], self.stall_left[alive]
+
+        seen = self.rng.random(len(self.pos)) >= self.miss_rate
+        centers = self.pos[seen] + self.rng.normal(0, self.noise, (int(seen.sum()), 2))
+        half = self.size[seen] / 2.0
+        boxes = np.concatenate([centers - half, centers + half], axis=1)
+        return boxes.astype(int).tolist()
+
+
+def rss_mb():
+    """Memoria residente actual en MB (máximo histórico si no hay /proc)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def build_world(n_channels, args, rng):
+    """Una instancia de TrafficLightSystem por cada 4 canales; retorna (sistemas, [(sistema, canal, cámara)])"""
+    from main import TrafficLightSystem
+
+    systems, streams = [], []
+    for s in range(math.ceil(n_channels / len(cfg.CAMERA_CHANNELS))):
+        # Sin frames (frame=None) las alertas solo se cuentan: sin evidencias en disco ni webhook
+        system = TrafficLightSystem(detector=VehicleDetector(load=False), start_services=False)
+        systems.append(system)
+        for ch in cfg.CAMERA_CHANNELS:
+            if len(streams) == n_channels:
+                break
+            zone = system.live_zones[ch]['main']
+            if not len(zone):
+                zone = [[0, 0], [FRAME_W, FRAME_H]]
+            cam = SyntheticCamera(rng, zone, system.COLLISION_DIST, args.vehicles, args.arrival_rate, args.stalled,
+                                  args.collision_rate, args.stall_time, args.miss_rate)
+            streams.append((system, ch, cam))
+    return systems, streams
+
+
+def run(n_channels, args):
+    rng = np.random.default_rng(args.seed)
+    systems, streams = build_world(n_channels, args, rng)
+    sim_time = time.time()
+
+    # Calentamiento: llenar las escenas antes de medir
+    for _ in range(args.warmup):
+        sim_time += args.dt
+        for system, ch, cam in streams:
+            system.process_detections(ch, cam.step(args.dt), None, now=sim_time)
+        for system in systems:
+            system.intelligent_control_step(now=sim_time)
+
+    rss_start = rss_mb()
+    tick_times, boxes = [], 0
+    t_end = time.perf_counter() + args.duration
+    while time.perf_counter() < t_end and (args.ticks <= 0 or len(tick_times) < args.ticks):
+        sim_time += args.dt
+        # La generación de cajas no es parte del costo medido
+        frames = [cam.step(args.dt) for _, _, cam in streams]
+        t0 = time.perf_counter()
+        for (system, ch, _), rects in zip(streams, frames):
+            system.process_detections(ch, rects, None, now=sim_time)
+        for system in systems:
+            system.intelligent_control_step(now=sim_time)
+        tick_times.append(time.perf_counter() - t0)
+        boxes += sum(len(r) for r in frames)
+    rss_end = rss_mb()
+
+    ticks = len(tick_times)
+    busy = sum(tick_times)
+    tick_times.sort()
+    p99 = tick_times[int(0.99 * (ticks - 1))] if ticks else float('nan')
+    return {'channels': n_channels, 'ticks': ticks, 'sim_seconds': ticks * args.dt,
+            'ticks_per_s': ticks / busy if busy > 0 else float('inf'),
+            'sustainable_ticks_per_s': 1.0 / p99 if p99 > 0 else float('inf'),
+            'boxes_per_tick': boxes / ticks if ticks else 0.0,
+            'alerts': sum(sum(s.incident_counts.values()) for s in systems), 'rss_start_mb': rss_start, 'rss_end_mb': rss_end,
+            'rss_growth_mb': rss_end - rss_start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga sintética de AITRAFFIC")
+    parser.add_argument('--channels', default="64", help="Número de canales o lista para barrido (4,16,64)")
+    parser.add_argument('--vehicles', type=int, default=30, help="Máximo de vehículos simultáneos por canal")
+    parser.add_argument('--arrival-rate', type=float, default=1.0, help="Llegadas por segundo por canal")
+    parser.add_argument('--stalled', type=float, default=0.05, help="Fracción de vehículos que se detienen")
+    parser.add_argument('--collision-rate', type=float, default=0.01, help="Choques por segundo por canal")
+    parser.add_argument('--stall-time', type=float, default=300.0, help="Segundos que un vehículo queda detenido")
+    parser.add_argument('--miss-rate', type=float, default=0.03, help="Probabilidad de perder una detección")
+    parser.add_argument('--dt', type=float, default=0.2,
+                        help="Segundos simulados por tick (por defecto, detección cada 5 frames a 25 fps)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Segundos de pared por configuración")
+    parser.add_argument('--ticks', type=int, default=0, help="Límite de ticks (0 = solo por duración)")
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    counts = [int(c) for c in args.channels.split(',') if c.strip()]
+    required = 1.0 / args.dt
+    results = []
+
+    # Las estadísticas (CSV) que escriba el sistema quedan en un directorio temporal
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for n in counts:
+                print(f"[CARGA] ▶ {n} canales, {args.vehicles} vehículos máx. por canal...")
+                results.append(run(n, args))
+        finally:
+            os.chdir(cwd)
+
+    print(f"\n{'CANALES':>8}{'TICKS':>8}{'SIM (s)':>9}{'CAJAS/TICK':>12}{'TICKS/S':>10}"
+          f"{'SOSTENIBLE':>12}{'ALERTAS':>9}{'RSS (MB)':>10}{'CRECIM.':>9}")
+    for r in results:
+        print(f"{r['channels']:>8}{r['ticks']:>8}{r['sim_seconds']:>9.0f}{r['boxes_per_tick']:>12.0f}"
+              f"{r['ticks_per_s']:>10.1f}{r['sustainable_ticks_per_s']:>12.1f}{r['alerts']:>9}"
+              f"{r['rss_end_mb']:>10.1f}{r['rss_growth_mb']:>+9.1f}")
+    print(f"\nTiempo real requiere {required:.1f} ticks/s (un tick = {args.dt:.2f}s simulados). "
+          f"'SOSTENIBLE' usa el p99 del tiempo por tick.")
+    ok = all(r['sustainable_ticks_per_s'] >= required for r in results)
+    for r in results:
+        if r['sustainable_ticks_per_s'] < required:
+            print(f"⚠️ {r['channels']} canales no se sostienen en tiempo real.")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,9 @@
+import argparse
 import datetime
-import math
+import json
 import os
+import random
+import signal
 import threading
 import time
 
@@ -10,14 +13,32 @@ import requests
 
 # Importar módulos propios
 import config as cfg
+import state_store
 import visualizer as vis
+from coordination import CorridorBus, GreenWaveCoordinator
+from detection_cache import DetectionRecorder
 from detector import VehicleDetector
+from frame_pool import FramePool
+from occupancy import build_grids
+from profiler import SamplingProfiler, install_signal_trigger, start_control_server
+from qos import CaptureClock, LatencyGovernor
+from signal_driver import SerialSignalDriver, SignalTimer, SimulatedCabinet
 from stats import StatsManager
+from telemetry import TelemetryUplink
 from tracker import EuclideanDistTracker
+from trajectory import TrajectoryStore
+from vehicle_state import VehicleStateTable, boxes_to_centers
 
 
 class TrafficLightSystem:
-    def __init__(self):
+    def __init__(self, detector=None, start_services=True, record_detections=None):
+        """
+        Args:
+            detector: Detector a usar; por defecto se carga VehicleDetector con YOLO.
+            start_services: Con False no se arrancan hilos de control, telemetría, bus de corredor,
+                perfilador ni se restaura el snapshot. Útil para benchmarks y simulaciones.
+            record_detections: Ruta donde grabar cada salida del detector para repetirla con replay.py.
+        """
         self.cameras = {}
 
         # Estados del sistema
@@ -29,9 +50,21 @@ class TrafficLightSystem:
         self.system_mode = {ch: 'INTELLIGENT' for ch in cfg.CAMERA_CHANNELS}
         self.last_frame_time = {ch: time.time() for ch in cfg.CAMERA_CHANNELS}
 
+        # Reconexión en segundo plano
+        self.camera_lock = threading.RLock()
+        self.reading_cameras = {}  # canal -> VideoCapture en lectura (fuera del lock)
+        self.retired_cameras = {}  # canal -> capturas reemplazadas durante esa lectura
+        self.reconnecting = set()
+        self.failure_since = {}
+        self.recovery_times = {ch: [] for ch in cfg.CAMERA_CHANNELS}
+
         # --- RASTREO Y DETECCIÓN DE INCIDENTES ---
         self.trackers = {ch: EuclideanDistTracker() for ch in cfg.CAMERA_CHANNELS}
-        self.vehicle_data = {ch: {} for ch in cfg.CAMERA_CHANNELS}
+        self.vehicle_data = {ch: VehicleStateTable() for ch in cfg.CAMERA_CHANNELS}
+        self.trajectories = {ch: TrajectoryStore(cfg.TRAJECTORY_LENGTH, cfg.MAX_TRACKS) for ch in cfg.CAMERA_CHANNELS}
+        self.homographies = {ch: cfg.get_homography(i) for i, ch in enumerate(cfg.CAMERA_CHANNELS)}
+        # Ocupación suavizada por carril (la escribe el hilo principal, la lee el control)
+        self.lane_occupancy = {ch: {} for ch in cfg.CAMERA_CHANNELS}
 
         # --- GESTOR DE ESTADÍSTICAS ---
         self.stats_manager = StatsManager()
@@ -41,6 +74,7 @@ class TrafficLightSystem:
 
         # ==========================================
         # ⚠️ CONFIGURACIÓN DE TIEMPO
+        self.incident_counts = {'breakdown': 0, 'collision': 0}
         self.ACCIDENT_TIME = 20.0  # Segundos detenido en VERDE para considerar avería
         # ==========================================
 
@@ -51,16 +85,20 @@ class TrafficLightSystem:
         self.frame_counter = 0
 
         # OPTIMIZACIÓN
-        self.detection_interval = 5
+        self.detection_interval = cfg.QOS_LEVELS[0]['interval']
 
-        # --- GESTIÓN DE ZONAS EN VIVO ---
-        self.live_zones = {}
-        for i, ch in enumerate(cfg.CAMERA_CHANNELS):
-            mz, az = cfg.get_zones(i)
-            self.live_zones[ch] = {
-                'main': mz[0] if len(mz) > 0 else [],
-                'arrow': az[0] if len(az) > 0 else []
-            }
+        # Calidad de servicio: escala, cadencia de detección y render por cámara según la latencia
+        self.qos = LatencyGovernor(cfg.CAMERA_CHANNELS, cfg.QOS_LEVELS, cfg.QOS_TARGET_AGE, cfg.QOS_WINDOW,
+                                   cfg.QOS_HEADROOM, cfg.QOS_UPGRADE_WINDOWS)
+        self.capture_clocks = {ch: CaptureClock() for ch in cfg.CAMERA_CHANNELS}
+        self.last_capture_time = {ch: time.time() for ch in cfg.CAMERA_CHANNELS}
+        self.rendered_tiles = set()
+        self.annotation_layers = {ch: vis.AnnotationLayer() for ch in cfg.CAMERA_CHANNELS}
+
+        # Buffers de frame reutilizables (captura, inferencia, evidencias, lienzos)
+        self.frame_pool = FramePool()
+        self.capture_buffers = {}
+        self.display_canvas = None
 
         # Variables de Edición
         self.is_editing = False
@@ -70,21 +108,90 @@ class TrafficLightSystem:
         self.click_cooldown = 0
 
         # Detector
-        self.detector = VehicleDetector()
+        self.detector = detector if detector is not None else VehicleDetector()
+        self.detection_recorder = None
+        if record_detections:
+            self.detection_recorder = DetectionRecorder(record_detections, {
+                'cameras': [{'source': ch, 'name': name} for ch, name in zip(cfg.CAMERA_CHANNELS, cfg.CAMERA_NAMES)],
+                'detection_interval': self.detection_interval})
+            print(f"💾 Grabando detecciones en {record_detections}")
+
+        # --- GESTIÓN DE ZONAS EN VIVO ---
+        # Cada canal guarda un juego de zonas inmutable (polígonos + rutas compiladas);
+        # al editar se reemplaza el juego completo, nunca se modifica en sitio.
+        self.live_zones = {}
+        for i, ch in enumerate(cfg.CAMERA_CHANNELS):
+            mz, az = cfg.get_zones(i)
+            self.live_zones[ch] = self.compile_zone_set(mz[0] if len(mz) > 0 else [],
+                                                        az[0] if len(az) > 0 else [])
+        self.load_zones_file()
 
         # Control de secuencia
         self.current_phase = 0
         self.phase_start_time = time.time()
+        self.phase_duration = cfg.PHASE_TIMES[self.current_phase]
         self.sequence_lock = threading.Lock()
         self.running = True
 
+        # Uplink de telemetría (opcional)
+        self.telemetry = None
+        if start_services and cfg.TELEMETRY_URL:
+            self.telemetry = TelemetryUplink(cfg.TELEMETRY_URL, cfg.TELEMETRY_INTERVAL, cfg.TELEMETRY_SPOOL_DIR,
+                                             cfg.TELEMETRY_MAX_RATE,
+                                             max_spool_bytes=cfg.TELEMETRY_MAX_SPOOL_MB * 1024 * 1024,
+                                             snapshot_source=self.telemetry_snapshot)
+            self.telemetry.start()
+
+        # Coordinación con intersecciones vecinas (opcional)
+        self.corridor_bus = None
+        self.coordinator = None
+        if start_services and cfg.COORDINATION_ENABLED:
+            self.corridor_bus = CorridorBus(cfg.COORDINATION_NODE_ID, cfg.COORDINATION_PORT,
+                                            peers=cfg.COORDINATION_PEERS,
+                                            multicast_group=cfg.COORDINATION_MULTICAST_GROUP,
+                                            peer_timeout=cfg.COORDINATION_PEER_TIMEOUT,
+                                            coordinated_phase=cfg.COORDINATED_PHASE)
+            self.coordinator = GreenWaveCoordinator(self.corridor_bus, cfg.COORDINATION_UPSTREAM,
+                                                    sum(cfg.PHASE_TIMES.values()), cfg.COORDINATION_MAX_SHIFT,
+                                                    cfg.YELLOW_TIME + cfg.MIN_GREEN_TIME)
+            self.corridor_bus.start()
+
+        # Perfilador por muestreo bajo demanda (señal SIGUSR1 o endpoint local)
+        self.profiler = SamplingProfiler(cfg.PROFILER_DIR, cfg.PROFILER_INTERVAL, cfg.PROFILER_MAX_SECONDS)
+        if start_services:
+            install_signal_trigger(self.profiler, cfg.PROFILER_DEFAULT_SECONDS)
+        if start_services and cfg.PROFILER_PORT:
+            try:
+                start_control_server(self.profiler, cfg.PROFILER_PORT, cfg.PROFILER_DEFAULT_SECONDS)
+            except OSError as e:
+                print(f"[PERFIL] No se pudo abrir el endpoint de control: {e}")
+
+        # Reinicio en caliente: retomar fase, contadores y zonas del último snapshot
+        self.last_state_save = time.time()
+        self.state_writer = None
+        self.state_restored = False
+        if start_services:
+            self.restore_runtime_state()
+
+        # Salida a semáforos: sin driver los estados se aplican directo a los dicts (simulaciones)
+        self.signal_timer = None
+        if start_services and cfg.SIGNAL_DRIVER:
+            self.signal_timer = SignalTimer(self.build_signal_driver(), self.signal_groups(), cfg.MIN_GREEN_TIME,
+                                            cfg.YELLOW_TIME, cfg.ALL_RED_TIME, cfg.SIGNAL_TICK,
+                                            on_change=self.mirror_signal_states,
+                                            on_fault=lambda n: self.record_telemetry('signal_fault', failures=n))
+            self.signal_timer.start()
+            # Retomar lo que indica el snapshot (o todo en rojo en arranque en frío)
+            self.command_lights(self.traffic_states, self.arrow_states)
+
         # Hilos
         self.threads = []
-        self.threads.append(threading.Thread(target=self.intelligent_control, daemon=True))
-        self.threads.append(threading.Thread(target=self.standard_control, daemon=True))
-        self.threads.append(threading.Thread(target=self.monitor_cameras, daemon=True))
+        self.threads.append(threading.Thread(target=self.intelligent_control, name="intelligent_control", daemon=True))
+        self.threads.append(threading.Thread(target=self.standard_control, name="standard_control", daemon=True))
+        self.threads.append(threading.Thread(target=self.monitor_cameras, name="monitor_cameras", daemon=True))
 
-        for t in self.threads: t.start()
+        if start_services:
+            for t in self.threads: t.start()
 
     # --- GESTIÓN DE EVIDENCIAS Y WEBHOOK (CON IMAGEN) ---
     def handle_incident_log(self, channel, vehicle_id, duration, incident_type, frame_copy, position):
@@ -99,6 +206,8 @@ class TrafficLightSystem:
 
         # Registrar estadísticas localmente
         self.stats_manager.log_incident(cam_name)
+        self.record_telemetry('incident', camera=cam_name, incident_type=incident_type, vehicle_id=int(vehicle_id),
+                              duration=round(float(duration), 1), position=[int(position[0]), int(position[1])])
 
         # Dibujar sobre la evidencia visual
         cx, cy = position
@@ -120,7 +229,7 @@ class TrafficLightSystem:
         # ---------------------------------------------------------
         # ENVÍO AL WEBHOOK DE N8N (DATOS + IMAGEN)
         # ---------------------------------------------------------
-        webhook_url = "https://n8n.trazo.xyz/webhook/sendMessageImg"
+        webhook_url = cfg.WEBHOOK_URL
 
         msj_intro = "⚠️ ALERTA DE TRAFICO"
         if incident_type == 'breakdown':
@@ -163,100 +272,139 @@ class TrafficLightSystem:
             print(f"[N8N] ❌ Error de conexión al subir imagen: {e}")
         # ---------------------------------------------------------
 
-    def trigger_alert(self, channel, vehicle_id, duration, incident_type, frame):
-        frame_copy = frame.copy()
-        try:
-            pos = self.vehicle_data[channel][vehicle_id]['last_pos']
-            t = threading.Thread(target=self.handle_incident_log,
-                                 args=(channel, vehicle_id, duration, incident_type, frame_copy, pos))
-            t.daemon = True
-            t.start()
-        except KeyError:
-            pass
+    # --- TELEMETRÍA ---
+    def record_telemetry(self, kind, **data):
+        if self.telemetry is not None:
+            self.telemetry.record_event(kind, data)
+
+    def telemetry_snapshot(self):
+        stats = self.stats_manager.get_state()
+        if self.signal_timer is not None:
+            stats['signals'] = self.signal_timer.report()
+        stats['frame_pool'] = self.frame_pool.stats()
+        stats['cameras'] = {str(ch): {'status': self.camera_status[ch], 'mode': self.system_mode[ch],
+                                      'occupancy': self.lane_occupancy[ch], 'qos_level': self.qos.level[ch],
+                                      'age_p90': self.qos.last_p90[ch]}
+                            for ch in cfg.CAMERA_CHANNELS}
+        return stats
+
+    def trigger_alert(self, channel, vehicle_id, duration, incident_type, frame, position):
+        self.incident_counts[incident_type] = self.incident_counts.get(incident_type, 0) + 1
+        if frame is None:
+            # Simulación o repetición sin imagen: solo se cuenta, sin evidencia ni webhook
+            return
+        # La evidencia sale del pool; el hilo la devuelve al terminar
+        evidence = self.frame_pool.acquire(('evidencia', channel), frame.shape, frame.dtype)
+        np.copyto(evidence.array, frame)
+
+        def _log():
+            try:
+                self.handle_incident_log(channel, vehicle_id, duration, incident_type, evidence.array, position)
+            finally:
+                evidence.release()
+
+        t = threading.Thread(target=_log, name=f"incident-{channel}-{vehicle_id}")
+        t.daemon = True
+        t.start()
 
     def update_vehicle_status(self, channel, tracked_objects, main_light, arrow_light, main_zone, arrow_zone,
-                              frame_for_evidence):
-        current_time = time.time()
-        active_ids = []
-
-        for obj in tracked_objects:
-            x, y, x2, y2, vid = obj
-            cx, cy = (x + x2) // 2, (y + y2) // 2
-            active_ids.append(vid)
-
-            if vid not in self.vehicle_data[channel]:
-                self.vehicle_data[channel][vid] = {
-                    'last_pos': (cx, cy), 'accumulated_time': 0.0, 'last_update_time': current_time,
-                    'incident_type': 'none', 'alert_sent': False, 'lane_type': 'unknown'
-                }
-            else:
-                data = self.vehicle_data[channel][vid]
-                dist = math.hypot(cx - data['last_pos'][0], cy - data['last_pos'][1])
-                dt = current_time - data['last_update_time']
-
-                # Detectar carril
-                is_in_arrow = self.detector.is_valid_detection(cx, cy, [arrow_zone])
-                is_in_main = self.detector.is_valid_detection(cx, cy, [main_zone])
-
-                relevant_light_color = 'red'
-                if is_in_arrow:
-                    relevant_light_color = arrow_light
-                    data['lane_type'] = 'arrow'
-                elif is_in_main:
-                    relevant_light_color = main_light
-                    data['lane_type'] = 'main'
-                else:
-                    relevant_light_color = main_light
-                    data['lane_type'] = 'main'
-
-                # --- MODIFICACIÓN DE LA LÓGICA DE AVERÍA (PAUSAR EN ROJO) ---
-                if dist > self.STOP_THRESHOLD:
-                    # El auto se mueve: Reiniciar contadores (está circulando bien)
-                    data['accumulated_time'] = 0.0
-                    data['incident_type'] = 'none'
-                    data['alert_sent'] = False
-                else:
-                    # El auto está detenido (distancia < threshold)
-                    if relevant_light_color == 'green':
-                        # Solo si es VERDE sumamos tiempo para detectar avería
-                        data['accumulated_time'] += dt
-
-                        if data['accumulated_time'] > self.ACCIDENT_TIME:
-                            if data['incident_type'] == 'none':
-                                data['incident_type'] = 'breakdown'
-
-                            if not data['alert_sent']:
-                                self.trigger_alert(channel, vid, data['accumulated_time'], data['incident_type'],
-                                                   frame_for_evidence)
-                                data['alert_sent'] = True
-                    else:
-                        # Si es ROJO o AMARILLO:
-                        # NO REINICIAMOS. Simplemente "pausamos" (no hacemos nada).
-                        # El acumulado se mantiene igual hasta que vuelva a ponerse en verde.
-                        pass
+                              frame_for_evidence, now=None):
+        current_time = now if now is not None else time.time()
+        ids, centers = boxes_to_centers(tracked_objects)
+
+        # Velocidad real a partir del historial (solo si la cámara tiene homografía)
+        self.trajectories[channel].update(ids, centers, current_time)
+        H = self.homographies[channel]
+        speeds, stop_speed = None, None
+        if H is not None:
+            speeds, _ = self.trajectories[channel].velocities(ids, H, cfg.SPEED_WINDOW)
+            stop_speed = cfg.STOP_SPEED
+
+        # Detectar carril en bloque: fuera de la zona de flecha se usa el semáforo principal
+        is_in_arrow = self.detector.points_in_zones(centers, [arrow_zone])
+        light_green = np.where(is_in_arrow, arrow_light == 'green', main_light == 'green')
+
+        # Detenido en VERDE acumula tiempo; en ROJO/AMARILLO el acumulado se pausa
+        alerts = self.vehicle_data[channel].update(ids, centers, current_time, is_in_arrow, light_green,
+                                                   self.STOP_THRESHOLD, self.ACCIDENT_TIME,
+                                                   speeds=speeds, stop_speed=stop_speed)
+        for vid, duration, incident_type, pos in alerts:
+            self.trigger_alert(channel, vid, duration, incident_type, frame_for_evidence, pos)
+
+        # Velocidad media de aproximación: vehículos en movimiento dentro de las zonas
+        if speeds is not None:
+            in_zone = is_in_arrow | self.detector.points_in_zones(centers, [main_zone])
+            approaching = in_zone & (speeds > cfg.STOP_SPEED)
+            if approaching.any():
+                cam_name = cfg.CAMERA_NAMES[cfg.CAMERA_CHANNELS.index(channel)]
+                self.stats_manager.update_speed(cam_name, float(np.mean(speeds[approaching])))
 
-                data['last_pos'] = (cx, cy)
-                data['last_update_time'] = current_time
+    def check_collisions(self, channel):
+        self.vehicle_data[channel].mark_collisions(self.ACCIDENT_TIME, self.COLLISION_DIST)
+
+    # --- ZONAS: COMPILACIÓN, EDICIÓN Y PERSISTENCIA ---
+    def compile_zone_set(self, main_zone, arrow_zone):
+        main_zone, arrow_zone = np.array(main_zone), np.array(arrow_zone)
+        # Zonas nuevas -> rejillas de ocupación nuevas (la historia anterior ya no aplica)
+        grids = build_grids({'main': main_zone, 'arrow': arrow_zone}, cfg.OCCUPANCY_CELL,
+                            cfg.OCCUPANCY_HALF_LIFE, cfg.OCCUPANCY_STOP_LINE)
+        return {
+            'main': main_zone,
+            'arrow': arrow_zone,
+            'main_path': self.detector.compile_zone(main_zone),
+            'arrow_path': self.detector.compile_zone(arrow_zone),
+            'main_grid': grids['main'],
+            'arrow_grid': grids['arrow']
+        }
 
-        known = list(self.vehicle_data[channel].keys())
-        for vid in known:
-            if vid not in active_ids: del self.vehicle_data[channel][vid]
+    def save_zones_file(self):
+        data = {str(ch): {k: np.asarray(zones[k]).tolist() for k in ('main', 'arrow')}
+                for ch, zones in self.live_zones.items()}
+        try:
+            state_store.atomic_write_json(cfg.ZONES_FILE, data)
+            print(f"[ZONAS] 💾 Zonas guardadas en {cfg.ZONES_FILE}")
+        except Exception as e:
+            print(f"[ZONAS] Error guardando zonas: {e}")
 
-    def check_collisions(self, channel):
-        stopped = []
-        for vid, data in self.vehicle_data[channel].items():
-            if data['accumulated_time'] > self.ACCIDENT_TIME:
-                stopped.append((vid, data['last_pos']))
-
-        n = len(stopped)
-        if n >= 2:
-            for i in range(n):
-                for j in range(i + 1, n):
-                    id1, p1 = stopped[i]
-                    id2, p2 = stopped[j]
-                    if math.hypot(p1[0] - p2[0], p1[1] - p2[1]) < self.COLLISION_DIST:
-                        self.vehicle_data[channel][id1]['incident_type'] = 'collision'
-                        self.vehicle_data[channel][id2]['incident_type'] = 'collision'
+    def load_zones_file(self):
+        if not os.path.exists(cfg.ZONES_FILE):
+            return
+        try:
+            with open(cfg.ZONES_FILE) as f:
+                data = json.load(f)
+            for ch in cfg.CAMERA_CHANNELS:
+                if str(ch) in data:
+                    self.live_zones[ch] = self.compile_zone_set(data[str(ch)]['main'], data[str(ch)]['arrow'])
+            print(f"[ZONAS] Zonas cargadas desde {cfg.ZONES_FILE}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[ZONAS] Error leyendo {cfg.ZONES_FILE}, se usan las de config: {e}")
+
+    def save_edited_zone(self):
+        if len(self.edit_points) < 3:
+            print("[ZONAS] ⚠️ Se necesitan al menos 3 puntos para guardar la zona.")
+            return False
+        ch = self.edit_channel
+        current = self.live_zones[ch]
+        new_zone = np.array(self.edit_points)
+        main_zone = new_zone if self.edit_zone_type == 'main' else current['main']
+        arrow_zone = new_zone if self.edit_zone_type == 'arrow' else current['arrow']
+        # Intercambio atómico: se publica un juego de zonas nuevo ya compilado
+        self.live_zones[ch] = self.compile_zone_set(main_zone, arrow_zone)
+        self.lane_occupancy[ch] = {}
+        self.save_zones_file()
+        return True
+
+    def handle_edit_key(self, k):
+        if k == 27:
+            self.is_editing = False
+        elif k == ord('z'):
+            if self.edit_points: self.edit_points.pop()
+        elif k == ord('t'):
+            self.edit_zone_type = 'arrow' if self.edit_zone_type == 'main' else 'main'
+            self.edit_points = []
+        elif k == ord('s'):
+            if self.save_edited_zone():
+                self.is_editing = False
 
     def mouse_callback(self, event, x, y, flags, param):
         if event == cv2.EVENT_LBUTTONDOWN:
@@ -278,8 +426,12 @@ class TrafficLightSystem:
     def has_vehicles(self, channel, type='any'):
         if self.system_mode[channel] != 'INTELLIGENT': return True
         cnt = self.detection_counts[channel]
-        if type == 'arrow': return cnt['arrow'] > 0
-        return cnt['main'] > 0 or cnt['arrow'] > 0
+        # La ocupación suavizada cubre los frames en que la detección pierde un vehículo
+        occ = self.lane_occupancy[channel]
+        present = {k: cnt[k] > 0 or (k in occ and occ[k]['peak'] >= cfg.OCCUPANCY_PRESENCE)
+                   for k in ('main', 'arrow')}
+        if type == 'arrow': return present['arrow']
+        return present['main'] or present['arrow']
 
     def should_skip_phase(self, phase):
         if phase == 0:
@@ -292,46 +444,125 @@ class TrafficLightSystem:
         return False
 
     def set_lights(self, phase, color='green'):
-        for ch in cfg.CAMERA_CHANNELS: self.traffic_states[ch] = 'red'; self.arrow_states[ch] = 'red'
+        traffic = {ch: 'red' for ch in cfg.CAMERA_CHANNELS}
+        arrows = {ch: 'red' for ch in cfg.CAMERA_CHANNELS}
         if color != 'red':
             if phase == 0:
-                self.arrow_states[cfg.CAMERA_CHANNELS[cfg.ESTE_IDX]] = color
-                self.arrow_states[cfg.CAMERA_CHANNELS[cfg.OESTE_IDX]] = color
+                arrows[cfg.CAMERA_CHANNELS[cfg.ESTE_IDX]] = color
+                arrows[cfg.CAMERA_CHANNELS[cfg.OESTE_IDX]] = color
             elif phase == 1:
-                self.traffic_states[cfg.CAMERA_CHANNELS[cfg.ESTE_IDX]] = color
-                self.traffic_states[cfg.CAMERA_CHANNELS[cfg.OESTE_IDX]] = color
+                traffic[cfg.CAMERA_CHANNELS[cfg.ESTE_IDX]] = color
+                traffic[cfg.CAMERA_CHANNELS[cfg.OESTE_IDX]] = color
             elif phase == 2:
-                self.traffic_states[cfg.CAMERA_CHANNELS[cfg.NORTE_IDX]] = color
+                traffic[cfg.CAMERA_CHANNELS[cfg.NORTE_IDX]] = color
             elif phase == 3:
-                self.traffic_states[cfg.CAMERA_CHANNELS[cfg.SUR_IDX]] = color
+                traffic[cfg.CAMERA_CHANNELS[cfg.SUR_IDX]] = color
+        self.command_lights(traffic, arrows)
+
+    # --- SALIDA A SEMÁFOROS ---
+    def signal_groups(self):
+        """Cabezas (canal, 'main'|'arrow') que se encienden juntas; grupos distintos están en conflicto"""
+        e, o = cfg.CAMERA_CHANNELS[cfg.ESTE_IDX], cfg.CAMERA_CHANNELS[cfg.OESTE_IDX]
+        return [[(e, 'arrow'), (o, 'arrow')],
+                [(e, 'main'), (o, 'main')],
+                [(cfg.CAMERA_CHANNELS[cfg.NORTE_IDX], 'main')],
+                [(cfg.CAMERA_CHANNELS[cfg.SUR_IDX], 'main')]]
+
+    def build_signal_driver(self):
+        groups = self.signal_groups()
+        if cfg.SIGNAL_DRIVER == 'serial':
+            driver = SerialSignalDriver(cfg.SIGNAL_SERIAL_PORT, cfg.SIGNAL_SERIAL_BAUD, [h for g in groups for h in g])
+            try:
+                driver.open()
+                driver.close()
+                return driver
+            except Exception as e:
+                print(f"[SEÑALES] ❌ No se pudo abrir {cfg.SIGNAL_SERIAL_PORT}: {e}. Usando gabinete simulado.")
+        return SimulatedCabinet(groups)
+
+    def command_lights(self, traffic, arrows):
+        """Envía colores pedidos por canal; con driver, el hilo de temporización decide cuándo aplicarlos"""
+        if self.signal_timer is None:
+            self.traffic_states.update(traffic)
+            self.arrow_states.update(arrows)
+            return
+        request = {(ch, 'main'): c for ch, c in traffic.items()}
+        request.update({(ch, 'arrow'): c for ch, c in arrows.items()})
+        self.signal_timer.request(request)
+
+    def mirror_signal_states(self, states):
+        """Los dicts de estado reflejan lo que el gabinete confirmó, no lo pedido"""
+        for (ch, kind), color in states.items():
+            (self.traffic_states if kind == 'main' else self.arrow_states)[ch] = color
+
+    # --- COORDINACIÓN DE CORREDOR (ONDA VERDE) ---
+    def precedes_coordinated(self, phase):
+        """
+        True si tras `phase` viene la fase coordinada: es la siguiente, o las fases intermedias
+        se saltarían con la demanda actual (p. ej. la 3 cuando la 0 no tiene vehículos en flecha).
+        Es una predicción al inicio de la fase; si la demanda cambia, la fase intermedia que sí
+        corra hará el ajuste en su lugar.
+        """
+        if phase == cfg.COORDINATED_PHASE:
+            return False
+        nxt = (phase + 1) % 4
+        while nxt != cfg.COORDINATED_PHASE:
+            if not self.should_skip_phase(nxt):
+                return False
+            nxt = (nxt + 1) % 4
+        return True
+
+    def compute_phase_duration(self, phase):
+        """Duración nominal; la fase que precede a la coordinada se ajusta según los vecinos"""
+        nominal = cfg.PHASE_TIMES[phase]
+        if self.coordinator is not None and self.precedes_coordinated(phase):
+            return nominal + self.coordinator.adjustment(self.phase_start_time, nominal)
+        return nominal
+
+    def corridor_demand(self):
+        """Vehículos en los carriles rectos E-O: lo que saldrá hacia la siguiente intersección"""
+        e, o = cfg.CAMERA_CHANNELS[cfg.ESTE_IDX], cfg.CAMERA_CHANNELS[cfg.OESTE_IDX]
+        return self.detection_counts[e]['main'] + self.detection_counts[o]['main']
 
     def intelligent_control(self):
         while self.running:
-            with self.sequence_lock:
-                if not any(self.system_mode[ch] == 'INTELLIGENT' for ch in cfg.CAMERA_CHANNELS):
-                    time.sleep(1)
-                    continue
+            if not self.intelligent_control_step():
+                time.sleep(1)
+                continue
+            time.sleep(0.5)
 
-                elapsed = time.time() - self.phase_start_time
-                if elapsed >= cfg.PHASE_TIMES[self.current_phase] - cfg.YELLOW_TIME:
-                    if elapsed < cfg.PHASE_TIMES[self.current_phase]:
-                        self.set_lights(self.current_phase, 'yellow')
+    def intelligent_control_step(self, now=None):
+        """Un paso del control adaptativo. Retorna False si ninguna cámara está en modo INTELLIGENT."""
+        now = now if now is not None else time.time()
+        with self.sequence_lock:
+            if not any(self.system_mode[ch] == 'INTELLIGENT' for ch in cfg.CAMERA_CHANNELS):
+                return False
+
+            elapsed = now - self.phase_start_time
+            if elapsed >= self.phase_duration - cfg.YELLOW_TIME:
+                if elapsed < self.phase_duration:
+                    self.set_lights(self.current_phase, 'yellow')
+                else:
+                    next_ph = (self.current_phase + 1) % 4
+                    skipped = 0
+                    while self.should_skip_phase(next_ph) and skipped < 4:
+                        print(f"⏭️ Saltando fase {next_ph} (Sin vehiculos)")
+                        next_ph = (next_ph + 1) % 4
+                        skipped += 1
+                    if skipped == 4:
+                        if self.current_phase != 1:
+                            self.current_phase = 1
+                            self.set_lights(1, 'green')
                     else:
-                        next_ph = (self.current_phase + 1) % 4
-                        skipped = 0
-                        while self.should_skip_phase(next_ph) and skipped < 4:
-                            print(f"⏭️ Saltando fase {next_ph} (Sin vehiculos)")
-                            next_ph = (next_ph + 1) % 4
-                            skipped += 1
-                        if skipped == 4:
-                            if self.current_phase != 1:
-                                self.current_phase = 1
-                                self.set_lights(1, 'green')
-                        else:
-                            self.current_phase = next_ph
-                            self.set_lights(next_ph, 'green')
-                        self.phase_start_time = time.time()
-            time.sleep(0.5)
+                        self.current_phase = next_ph
+                        self.set_lights(next_ph, 'green')
+                    self.phase_start_time = now
+                    self.phase_duration = self.compute_phase_duration(self.current_phase)
+                    self.record_telemetry('phase', phase=self.current_phase, skipped=skipped)
+                    if self.corridor_bus is not None:
+                        self.corridor_bus.publish_phase(self.current_phase, self.phase_start_time,
+                                                        self.corridor_demand())
+        return True
 
     def standard_control(self):
         durations = [cfg.PHASE_TIMES[i] for i in range(4)]
@@ -352,6 +583,7 @@ class TrafficLightSystem:
                 start_t = time.time()
                 is_yellow = False
 
+            traffic, arrows = {}, {}
             for ch in std_cams:
                 idx = cfg.CAMERA_CHANNELS.index(ch)
                 t_color, a_color = 'red', 'red'
@@ -364,142 +596,380 @@ class TrafficLightSystem:
                 elif curr_ph == 3 and idx == cfg.SUR_IDX:
                     t_color = 'yellow' if is_yellow else 'green'
 
-                self.traffic_states[ch] = t_color
-                self.arrow_states[ch] = a_color
+                traffic[ch] = t_color
+                arrows[ch] = a_color
+            self.command_lights(traffic, arrows)
             time.sleep(0.2)
 
-    def process_camera(self, channel, frame):
+    def process_detections(self, channel, rects, frame=None, now=None):
+        """
+        Todo lo posterior a la detección: tracking, aforo, incidentes y conteos por zona.
+
+        Args:
+            rects: Cajas [x, y, x2, y2] en coordenadas del frame original.
+            frame: Frame para la evidencia de incidentes (None cuando no hay imagen, p. ej. simulación).
+            now: Marca de tiempo a usar (por defecto el reloj real).
+        """
+        tracked_objects = self.trackers[channel].update(rects)
+        self.last_detections[channel] = tracked_objects
+
+        try:
+            cam_idx = cfg.CAMERA_CHANNELS.index(channel)
+            cam_name = cfg.CAMERA_NAMES[cam_idx]
+            self.stats_manager.update_flow(cam_name, self.trackers[channel].id_count)
+        except:
+            pass
+
+        curr_main_light = self.traffic_states[channel]
+        curr_arrow_light = self.arrow_states[channel]
+        # Un solo acceso: si el editor guarda una zona a mitad de frame, este frame usa el juego anterior
+        zones = self.live_zones[channel]
+        main_zone = zones['main_path']
+        arrow_zone = zones['arrow_path']
+
+        self.update_vehicle_status(channel, tracked_objects, curr_main_light, curr_arrow_light,
+                                   main_zone, arrow_zone, frame, now=now)
+
+        self.check_collisions(channel)
+
+        _, centers = boxes_to_centers(tracked_objects)
+        in_zone = {'main': self.detector.points_in_zones(centers, [main_zone]),
+                   'arrow': self.detector.points_in_zones(centers, [arrow_zone])}
+        self.detection_counts[channel] = {k: int(np.count_nonzero(m)) for k, m in in_zone.items()}
+
+        self.update_occupancy(channel, zones, tracked_objects, in_zone, now)
+        return tracked_objects
+
+    def update_occupancy(self, channel, zones, tracked_objects, in_zone, now=None):
+        """
+        Args:
+            in_zone: {'main'|'arrow': máscara por objeto} con el mismo criterio de centro que detection_counts;
+                cada carril solo recibe la huella de sus vehículos, no la de cajas vecinas que lo rozan.
+        """
+        now = now if now is not None else time.time()
+        boxes = np.asarray(tracked_objects, dtype=np.int64).reshape(-1, 5)[:, :4]
+        occupancy = {}
+        for k in ('main', 'arrow'):
+            grid = zones[f'{k}_grid']
+            if grid is None:
+                continue
+            grid.update(boxes[np.asarray(in_zone[k], dtype=bool)], now)
+            queue_px, queue_frac = grid.queue_length(cfg.OCCUPANCY_QUEUE_LEVEL)
+            occupancy[k] = {'occupancy': grid.occupancy(), 'peak': grid.peak(),
+                            'queue_px': queue_px, 'queue_frac': queue_frac}
+        # Se reemplaza el dict completo: el hilo de control nunca ve una actualización a medias
+        self.lane_occupancy[channel] = occupancy
+
+    def observe_latency(self, channel, age):
+        previous = self.qos.level[channel]
+        level = self.qos.observe(channel, age)
+        if level is None:
+            return
+        p = cfg.QOS_LEVELS[level]
+        p90 = self.qos.last_p90[channel]
+        cam_name = cfg.CAMERA_NAMES[cfg.CAMERA_CHANNELS.index(channel)]
+        print(f"[QOS] {'⬇️' if level > previous else '⬆️'} {cam_name}: nivel {level} (escala {p['scale']}, "
+              f"detección cada {p['interval']} frames, render 1/{p['render_every']}) | p90 {p90 * 1000:.0f} ms")
+        self.record_telemetry('qos', channel=channel, level=level, p90=p90)
+
+    def process_camera(self, channel, frame, capture_time=None):
+        """
+        Detección y decisión sobre un frame; las cajas se componen después sobre el mosaico (annotate_tile).
+
+        Args:
+            capture_time: Hora local estimada de captura del frame, para medir la edad captura -> decisión.
+        """
         self.last_frame_time[channel] = time.time()
         if self.system_mode[channel] != 'INTELLIGENT': return frame
 
-        if self.frame_counter % self.detection_interval == 0:
+        params = self.qos.params(channel)
+        if self.frame_counter % params['interval'] == 0:
             h, w = frame.shape[:2]
-            scale_factor = 0.4
-            small = cv2.resize(frame, (int(w * scale_factor), int(h * scale_factor)))
+            scale_factor = params['scale']
+            sw, sh = int(w * scale_factor), int(h * scale_factor)
+            small = self.frame_pool.acquire(('inferencia', channel), (sh, sw, 3))
+            cv2.resize(frame, (sw, sh), dst=small.array)
 
-            bboxes = self.detector.detect(small)
+            bboxes, scores = self.detector.detect_with_scores(small.array)
+            small.release()
             rects = (bboxes / scale_factor).astype(int).tolist() if len(bboxes) > 0 else []
-
-            tracked_objects = self.trackers[channel].update(rects)
-            self.last_detections[channel] = tracked_objects
-
-            try:
-                cam_idx = cfg.CAMERA_CHANNELS.index(channel)
-                cam_name = cfg.CAMERA_NAMES[cam_idx]
-                self.stats_manager.update_flow(cam_name, self.trackers[channel].id_count)
-            except:
-                pass
-
-            curr_main_light = self.traffic_states[channel]
-            curr_arrow_light = self.arrow_states[channel]
-            main_zone = self.live_zones[channel]['main']
-            arrow_zone = self.live_zones[channel]['arrow']
-
-            self.update_vehicle_status(channel, tracked_objects, curr_main_light, curr_arrow_light,
-                                       main_zone, arrow_zone, frame)
-
-            self.check_collisions(channel)
-
-            mz_list = [main_zone]
-            az_list = [arrow_zone]
-            cm, ca = 0, 0
-            for obj in tracked_objects:
-                cx, cy = (obj[0] + obj[2]) // 2, (obj[1] + obj[3]) // 2
-                if self.detector.is_valid_detection(cx, cy, mz_list): cm += 1
-                if self.detector.is_valid_detection(cx, cy, az_list): ca += 1
-            self.detection_counts[channel] = {'main': cm, 'arrow': ca}
-
-        for obj in self.last_detections[channel]:
-            x, y, x2, y2, vid = obj
-            v_data = self.vehicle_data[channel].get(vid, {})
-            accum = v_data.get('accumulated_time', 0)
-            itype = v_data.get('incident_type', 'none')
-
-            if itype == 'breakdown' or accum > self.ACCIDENT_TIME:
-                color = (0, 0, 255)
-                cv2.rectangle(frame, (x, y), (x2, y2), color, 4)
-                mins = int(accum // 60)
-                secs = int(accum % 60)
-                label = f"ALERTA {mins:02d}:{secs:02d}"
-                (w_text, h_text), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)
-                cv2.rectangle(frame, (x, y - 35), (x + w_text + 10, y), color, -1)
-                cv2.putText(frame, label, (x + 5, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-            elif itype == 'collision':
-                color = (255, 0, 255)
-                label = f"CHOQUE {int(accum)}s"
-                cv2.rectangle(frame, (x, y), (x2, y2), color, 4)
-                cv2.putText(frame, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-            else:
-                color = (255, 0, 0)
-                if accum > 10.0:
-                    color = (0, 255, 255)
-                    label = f"ID:{vid} | {int(accum)}s"
-                    cv2.rectangle(frame, (x, y), (x2, y2), color, 2)
-                    cv2.putText(frame, label, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-                else:
-                    cv2.rectangle(frame, (x, y), (x2, y2), color, 1)
-                    cv2.putText(frame, f"ID:{vid}", (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+            if self.detection_recorder is not None:
+                self.detection_recorder.record(self.frame_counter, cfg.CAMERA_CHANNELS.index(channel), rects, scores)
+            self.process_detections(channel, rects, frame)
+            if capture_time is not None:
+                self.observe_latency(channel, time.time() - capture_time)
 
         return frame
 
+    def annotate_tile(self, channel, tile, frame_shape):
+        """Compone las cajas y etiquetas de los tracks sobre el mosaico ya reducido"""
+        if self.system_mode[channel] != 'INTELLIGENT':
+            return
+        # Las etiquetas (tiempo detenido, tipo de incidente) solo cambian en process_detections, que
+        # también reemplaza la lista de tracks: mientras sea la misma, la capa cacheada sigue vigente
+        tracked = self.last_detections[channel]
+        layer = self.annotation_layers[channel]
+        key = (frame_shape[:2], tile.shape[:2])
+        if layer.is_stale(tracked, key):
+            scale = tile.shape[1] / frame_shape[1]
+            layer.rebuild(tracked, key, tile.shape, lambda canvas: vis.draw_vehicle_boxes(
+                canvas, tracked, self.vehicle_data[channel], self.ACCIDENT_TIME, scale))
+        layer.composite(tile)
+
     def monitor_cameras(self):
         while self.running:
             now = time.time()
             for ch in cfg.CAMERA_CHANNELS:
                 if self.camera_status[ch] == 'active' and (now - self.last_frame_time[ch] > cfg.CAMERA_TIMEOUT):
                     print(f"⚠️ WATCHDOG: Timeout en camara {ch}. Cambiando a STANDARD.")
-                    self.camera_status[ch] = 'failed'
-                    self.system_mode[ch] = 'STANDARD'
-                    self.attempt_reconnect(ch)
+                    self.mark_camera_failed(ch)
+                elif self.camera_status[ch] == 'failed':
+                    # Cámaras caídas al arrancar o por lectura fallida también se reintentan
+                    self.schedule_reconnect(ch)
             time.sleep(2)
 
-    def attempt_reconnect(self, channel):
-        try:
-            if channel in self.cameras: self.cameras[channel].release()
+    def mark_camera_failed(self, channel):
+        if self.camera_status[channel] != 'failed':
+            self.failure_since[channel] = time.time()
+            self.record_telemetry('camera', channel=channel, status='failed')
+        self.camera_status[channel] = 'failed'
+        self.system_mode[channel] = 'STANDARD'
+        self.schedule_reconnect(channel)
+
+    def open_camera(self, channel, timeout):
+        """
+        Abre la cámara y lee un frame de prueba (health check) en un hilo aparte.
+        Retorna el VideoCapture listo o None si falla o excede el timeout.
+        """
+        result = {'cap': None, 'abandoned': False}
+        lock = threading.Lock()
+
+        def _worker():
             cap = cv2.VideoCapture(channel)
-            if cap.isOpened():
-                self.cameras[channel] = cap
-                self.camera_status[channel] = 'active'
-                self.last_frame_time[channel] = time.time()
-        except:
-            pass
+            ok = cap.isOpened() and cap.read()[0]
+            with lock:
+                if ok and not result['abandoned']:
+                    result['cap'] = cap
+                    return
+            cap.release()
+
+        t = threading.Thread(target=_worker, name=f"open-cam-{channel}", daemon=True)
+        t.start()
+        t.join(timeout)
+        with lock:
+            # Un open colgado (p. ej. RTSP) se abandona; si termina después, el hilo libera la cámara
+            result['abandoned'] = True
+            return result['cap']
+
+    def install_camera(self, channel, cap, reset_state=True):
+        """reset_state=False en el arranque con snapshot restaurado: se conservan tracks y tiempos de detención"""
+        with self.camera_lock:
+            old = self.cameras.get(channel)
+            self.cameras[channel] = cap
+            if reset_state:
+                # Estado fresco: los tiempos de detención previos a la caída ya no son válidos
+                self.trackers[channel].center_points = {}
+                self.vehicle_data[channel].clear()
+                self.trajectories[channel].clear()
+                self.last_detections[channel] = []
+            self.last_frame_time[channel] = time.time()
+            self.camera_status[channel] = 'active'
+            self.camera_failures[channel] = 0
+            self.system_mode[channel] = 'INTELLIGENT'
+        if old is not None and old is not cap:
+            self.release_camera(channel, old)
+
+    def schedule_reconnect(self, channel):
+        with self.camera_lock:
+            if channel in self.reconnecting or not self.running:
+                return
+            self.reconnecting.add(channel)
+        t = threading.Thread(target=self.reconnect_loop, args=(channel,), name=f"reconnect-cam-{channel}",
+                             daemon=True)
+        t.start()
+
+    def reconnect_loop(self, channel):
+        """Reintentos en segundo plano con backoff exponencial y jitter; no bloquea al watchdog"""
+        try:
+            with self.camera_lock:
+                old = self.cameras.pop(channel, None)
+            if old is not None:
+                self.release_camera(channel, old)
+
+            while self.running:
+                cap = self.open_camera(channel, cfg.CAMERA_OPEN_TIMEOUT)
+                if cap is not None:
+                    self.install_camera(channel, cap)
+                    recovery = time.time() - self.failure_since.get(channel, time.time())
+                    self.recovery_times[channel].append(recovery)
+                    self.record_telemetry('camera', channel=channel, status='active', recovery_s=round(recovery, 1))
+                    print(f"✅ RECONEXION: Camara {channel} de vuelta en INTELLIGENT "
+                          f"(recuperacion: {recovery:.1f}s).")
+                    return
+
+                self.camera_failures[channel] += 1
+                delay = min(cfg.RECONNECT_MAX_DELAY,
+                            cfg.RECONNECT_BASE_DELAY * (2 ** (self.camera_failures[channel] - 1)))
+                delay *= random.uniform(0.5, 1.0)
+                print(f"[..] Camara {channel}: reintento {self.camera_failures[channel]} fallido, "
+                      f"siguiente en {delay:.1f}s")
+                time.sleep(delay)
+        finally:
+            with self.camera_lock:
+                self.reconnecting.discard(channel)
+
+    def read_camera(self, channel):
+        # El lock solo cubre tomar la referencia: una lectura RTSP colgada no debe bloquear al watchdog
+        with self.camera_lock:
+            cap = self.cameras.get(channel)
+            if cap is None:
+                return False, None
+            self.reading_cameras[channel] = cap
+        try:
+            if not cap.isOpened():
+                return False, None
+            # Decodificar directo en el buffer de la cámara; si OpenCV tuvo que reservar otro
+            # (primer frame o cambio de resolución) se pasa a un buffer del pool con esa forma.
+            # Solo el hilo principal lee, así que el buffer no necesita lock.
+            buf = self.capture_buffers.get(channel)
+            ret, frame = cap.read(buf.array if buf is not None else None)
+            if ret and (buf is None or frame is not buf.array):
+                if buf is not None:
+                    buf.release()
+                buf = self.frame_pool.acquire(('captura', channel), frame.shape, frame.dtype)
+                np.copyto(buf.array, frame)
+                self.capture_buffers[channel] = buf
+                frame = buf.array
+            if ret:
+                self.last_capture_time[channel] = self.capture_clocks[channel].capture_time(
+                    cap.get(cv2.CAP_PROP_POS_MSEC), time.time())
+            return ret, frame
+        finally:
+            with self.camera_lock:
+                self.reading_cameras.pop(channel, None)
+                retired = self.retired_cameras.pop(channel, [])
+            for old in retired:
+                old.release()
+
+    def release_camera(self, channel, cap):
+        """Libera un VideoCapture reemplazado; si el hilo principal lo está leyendo, lo libera read_camera al terminar"""
+        with self.camera_lock:
+            if self.reading_cameras.get(channel) is cap:
+                self.retired_cameras.setdefault(channel, []).append(cap)
+                return
+        cap.release()
 
     def initialize_cameras(self):
         print("\n" + "=" * 50)
         print("   INICIANDO SECUENCIA DE CONEXION DE CAMARAS")
         print("=" * 50)
-        for i, ch in enumerate(cfg.CAMERA_CHANNELS):
+
+        def _bring_up(i, ch):
             cam_name = cfg.CAMERA_NAMES[i]
-            print(f"\n[..] Conectando {cam_name} (Input: {ch})...")
+            print(f"[..] Conectando {cam_name} (Input: {ch})...")
+            start = time.time()
             try:
-                cap = cv2.VideoCapture(ch)
-                time.sleep(1.5)
-                if cap.isOpened():
-                    ret, frame = cap.read()
-                    if ret:
-                        self.cameras[ch] = cap
-                        self.camera_status[ch] = 'active'
-                        self.system_mode[ch] = 'INTELLIGENT'
-                        self.last_frame_time[ch] = time.time()
-                        print(f"✅ EXITO: {cam_name} conectada.")
-                    else:
-                        print(f"⚠️ {cam_name} devolvió imagen vacía.")
-                        self.camera_status[ch] = 'failed'
-                        self.system_mode[ch] = 'STANDARD'
-                        cap.release()
-                else:
-                    print(f"❌ ERROR: No se pudo abrir {cam_name}.")
-                    self.camera_status[ch] = 'failed'
-                    self.system_mode[ch] = 'STANDARD'
+                cap = self.open_camera(ch, cfg.CAMERA_OPEN_TIMEOUT)
             except Exception as e:
                 print(f"❌ ERROR CRITICO en {cam_name}: {e}")
+                cap = None
+            if cap is not None:
+                # Reconexiones posteriores sí limpian el estado; el arranque respeta el snapshot
+                self.install_camera(ch, cap, reset_state=not self.state_restored)
+                print(f"✅ EXITO: {cam_name} conectada ({time.time() - start:.1f}s).")
+            else:
+                print(f"❌ ERROR: No se pudo abrir {cam_name} (timeout {cfg.CAMERA_OPEN_TIMEOUT}s o imagen vacía).")
+                self.failure_since[ch] = start
                 self.camera_status[ch] = 'failed'
                 self.system_mode[ch] = 'STANDARD'
+
+        # Todas las cámaras se abren en paralelo; cada una tiene su propio timeout
+        workers = [threading.Thread(target=_bring_up, args=(i, ch), daemon=True)
+                   for i, ch in enumerate(cfg.CAMERA_CHANNELS)]
+        for t in workers: t.start()
+        for t in workers: t.join(cfg.CAMERA_OPEN_TIMEOUT + 1.0)
+
         print("\n" + "=" * 50)
         print(
             f"   RESUMEN: {sum(1 for s in self.camera_status.values() if s == 'active')}/{len(cfg.CAMERA_CHANNELS)} Camaras operativas")
         print("=" * 50 + "\n")
 
+    # --- SNAPSHOT DE ESTADO (REINICIO EN CALIENTE) ---
+    def build_runtime_state(self):
+        with self.sequence_lock:
+            phase = {'current_phase': self.current_phase, 'phase_start_time': self.phase_start_time,
+                     'phase_duration': self.phase_duration}
+        return {
+            'phase': phase,
+            'traffic_states': {str(ch): c for ch, c in self.traffic_states.items()},
+            'arrow_states': {str(ch): c for ch, c in self.arrow_states.items()},
+            'trackers': {str(ch): t.get_state() for ch, t in self.trackers.items()},
+            'vehicles': {str(ch): v.to_dict() for ch, v in self.vehicle_data.items()},
+            'zones': {str(ch): {k: np.asarray(zones[k]).tolist() for k in ('main', 'arrow')}
+                      for ch, zones in self.live_zones.items()},
+            'stats': self.stats_manager.get_state()
+        }
+
+    def save_runtime_state(self, state=None):
+        try:
+            state_store.save_state(cfg.STATE_FILE, state if state is not None else self.build_runtime_state())
+        except Exception as e:
+            print(f"[ESTADO] Error guardando snapshot: {e}")
+
+    def check_state_save(self):
+        """El snapshot se arma en el loop (copia consistente) y se escribe con fsync en otro hilo"""
+        if time.time() - self.last_state_save <= cfg.STATE_SAVE_INTERVAL:
+            return
+        if self.state_writer is not None and self.state_writer.is_alive():
+            return  # Disco lento: no se acumulan escrituras pendientes
+        self.last_state_save = time.time()
+        self.state_writer = threading.Thread(target=self.save_runtime_state, args=(self.build_runtime_state(),),
+                                             name="state_writer", daemon=True)
+        self.state_writer.start()
+
+    def restore_runtime_state(self):
+        state, age = state_store.load_state(cfg.STATE_FILE, cfg.STATE_MAX_AGE)
+        if state is None:
+            return
+        # Todo se valida y construye aparte; el estado vivo solo se reemplaza si el snapshot completo es válido
+        try:
+            now = time.time()
+            phase = int(state['phase']['current_phase'])
+            if phase not in cfg.PHASE_TIMES:
+                raise ValueError(f"fase desconocida: {phase}")
+            phase_start_time = float(state['phase']['phase_start_time'])
+            phase_duration = float(state['phase'].get('phase_duration', cfg.PHASE_TIMES[phase]))
+            traffic, arrows, trackers, vehicles, zones = {}, {}, {}, {}, {}
+            for ch in cfg.CAMERA_CHANNELS:
+                key = str(ch)
+                traffic[ch] = state['traffic_states'][key]
+                arrows[ch] = state['arrow_states'][key]
+                if traffic[ch] not in cfg.TRAFFIC_LIGHT_COLORS or arrows[ch] not in cfg.TRAFFIC_LIGHT_COLORS:
+                    raise ValueError(f"color desconocido en el canal {ch}")
+                trackers[ch] = EuclideanDistTracker()
+                trackers[ch].set_state(state['trackers'][key])
+                vehicles[ch] = VehicleStateTable()
+                vehicles[ch].load_dict(state['vehicles'][key], now)
+                zones[ch] = self.compile_zone_set(state['zones'][key]['main'], state['zones'][key]['arrow'])
+            stats = state['stats']
+            self.stats_manager.parse_state(stats)
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            print(f"[ESTADO] Snapshot inválido, arranque en frío: {e}")
+            return
+
+        with self.sequence_lock:
+            self.current_phase = phase
+            self.phase_start_time = phase_start_time
+            self.phase_duration = phase_duration
+        self.traffic_states.update(traffic)
+        self.arrow_states.update(arrows)
+        self.trackers.update(trackers)
+        self.vehicle_data.update(vehicles)
+        self.live_zones.update(zones)
+        self.stats_manager.restore_state(stats)
+        self.state_restored = True
+        print(f"♻️ ESTADO: Snapshot restaurado (antigüedad {age:.1f}s, fase {self.current_phase}).")
+
     def run(self):
         print("=== SISTEMA DE TRAFICO AI INICIADO ===")
         self.initialize_cameras()
@@ -507,66 +977,134 @@ class TrafficLightSystem:
         cv2.namedWindow(window_name)
         cv2.setMouseCallback(window_name, self.mouse_callback)
 
+        # Lienzo fijo del dashboard: grid 2x2 de mosaicos de 480x360 + menú lateral
+        self.display_canvas = self.frame_pool.acquire('pantalla', (720, 960 + vis.DASHBOARD_MENU_W, 3))
+        self.display_canvas.array.fill(0)
+        self.grid_view = self.display_canvas.array[:, :960]
+        self.tile_views = [self.grid_view[r * 360:(r + 1) * 360, c * 480:(c + 1) * 480]
+                           for r in range(2) for c in range(2)]
+
+        # SIGTERM (systemd, docker stop) sale por el mismo camino que Ctrl-C y guarda el snapshot
+        signal.signal(signal.SIGTERM, self._terminate)
+        try:
+            self.display_loop(window_name)
+        except KeyboardInterrupt:
+            print("\n🛑 Interrupción recibida, guardando estado...")
+        finally:
+            self.shutdown()
+
+    @staticmethod
+    def _terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    def display_loop(self, window_name):
         while True:
             self.frame_counter += 1
             self.stats_manager.check_periodic_save()
-
-            if self.is_editing and self.edit_channel in self.cameras:
-                ret, raw = self.cameras[self.edit_channel].read()
-                if ret:
-                    edit_frame = vis.draw_edit_mode(raw.copy(), self.edit_points, f"EDITANDO: {self.edit_channel}",
-                                                    self.edit_zone_type)
-                    cv2.imshow(window_name, edit_frame)
-                k = cv2.waitKey(1) & 0xFF
-                if k == 27:
-                    self.is_editing = False
-                elif k == ord('z'):
-                    if self.edit_points: self.edit_points.pop()
-                elif k == ord('s'):
-                    self.live_zones[self.edit_channel][self.edit_zone_type] = np.array(self.edit_points)
-                    self.is_editing = False
+            self.check_state_save()
+
+            # La edición de zonas es una capa de UI: la detección y el control siguen en todos los canales
+            edit_buf = None
+            for i, ch in enumerate(cfg.CAMERA_CHANNELS):
+                camera_ok = False
+                render = True
+                blank = None
+                if ch in self.cameras:
+                    ret, raw = self.read_camera(ch)
+                    if ret:
+                        if self.is_editing and ch == self.edit_channel:
+                            # Copia limpia (antes del overlay) directo al lienzo del editor
+                            h, w = raw.shape[:2]
+                            edit_buf = self.frame_pool.acquire('edicion', (h, w + vis.EDIT_MENU_W, 3))
+                            np.copyto(edit_buf.array[:, :w], raw)
+                        render = self.qos.should_render(ch, self.frame_counter) or ch not in self.rendered_tiles
+                        frame = self.process_camera(ch, raw, self.last_capture_time[ch])
+                        camera_ok = True
+                    else:
+                        self.mark_camera_failed(ch)
+                if not camera_ok:
+                    self.rendered_tiles.discard(ch)
+                    blank = self.frame_pool.acquire('sin_senal', (360, 480, 3))
+                    blank.array.fill(0)
+                    frame = blank.array
+                elif not render:
+                    # Nivel QoS degradado: el mosaico anterior sigue en el lienzo
+                    continue
+                zones = self.live_zones[ch]
+                state = {
+                    'mode': self.system_mode[ch],
+                    'status': self.camera_status[ch],
+                    'traffic_color': self.traffic_states[ch],
+                    'arrow_color': self.arrow_states[ch],
+                    'counts': self.detection_counts[ch],
+                    'zones': (zones['main'], zones['arrow']),
+                    'occupancy': self.lane_occupancy[ch],
+                    'heatmaps': [g.heatmap() for g in (zones['main_grid'], zones['arrow_grid']) if g is not None]
+                    if cfg.SHOW_OCCUPANCY_HEATMAP and camera_ok else [],
+                    'qos_level': self.qos.level[ch]
+                }
+                frame = vis.add_overlay(frame, ch, cfg.CAMERA_NAMES[i], i, state)
+                if not camera_ok:
+                    cv2.putText(frame, "SIN SENAL", (140, 180), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                # El mosaico se escribe directo en su cuadrante del lienzo
+                cv2.resize(frame, (480, 360), dst=self.tile_views[i])
+                if camera_ok:
+                    self.annotate_tile(ch, self.tile_views[i], frame.shape)
+                    self.rendered_tiles.add(ch)
+                if blank is not None:
+                    blank.release()
+
+            if self.is_editing and edit_buf is not None:
+                w = edit_buf.array.shape[1] - vis.EDIT_MENU_W
+                final_view = vis.draw_edit_mode(edit_buf.array[:, :w], self.edit_points,
+                                                f"EDITANDO: {self.edit_channel}", self.edit_zone_type,
+                                                canvas=edit_buf.array)
             else:
-                frames_list = []
-                for i, ch in enumerate(cfg.CAMERA_CHANNELS):
-                    frame = np.zeros((360, 480, 3), dtype=np.uint8)
-                    camera_ok = False
-                    if ch in self.cameras and self.cameras[ch].isOpened():
-                        ret, raw = self.cameras[ch].read()
-                        if ret:
-                            frame = self.process_camera(ch, raw)
-                            camera_ok = True
-                        else:
-                            self.camera_status[ch] = 'failed'
-                            self.system_mode[ch] = 'STANDARD'
-                    state = {
-                        'mode': self.system_mode[ch],
-                        'status': self.camera_status[ch],
-                        'traffic_color': self.traffic_states[ch],
-                        'arrow_color': self.arrow_states[ch],
-                        'counts': self.detection_counts[ch],
-                        'zones': (self.live_zones[ch]['main'], self.live_zones[ch]['arrow'])
-                    }
-                    frame = vis.add_overlay(frame, ch, cfg.CAMERA_NAMES[i], i, state)
-                    if not camera_ok:
-                        cv2.putText(frame, "SIN SENAL", (140, 180), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    frames_list.append(cv2.resize(frame, (480, 360)))
-
-                top = np.hstack([frames_list[0], frames_list[1]])
-                bot = np.hstack([frames_list[2], frames_list[3]])
-                grid = np.vstack([top, bot])
                 dashboard_info = {'phase_idx': self.current_phase,
                                   'active_cams': sum(1 for s in self.camera_status.values() if s == 'active'),
                                   'intelligent_cams': sum(1 for m in self.system_mode.values() if m == 'INTELLIGENT')}
                 stats_data = self.stats_manager.get_dashboard_data()
-                final_view = vis.draw_dashboard(grid, dashboard_info, stats_data)
-                cv2.imshow(window_name, final_view)
-                if cv2.waitKey(1) & 0xFF == ord('q'): break
-
+                final_view = vis.draw_dashboard(self.grid_view, dashboard_info, stats_data,
+                                                canvas=self.display_canvas.array)
+            cv2.imshow(window_name, final_view)
+            if edit_buf is not None:
+                edit_buf.release()
+
+            k = cv2.waitKey(1) & 0xFF
+            if self.is_editing:
+                self.handle_edit_key(k)
+            elif k == ord('q'):
+                break
+
+    def shutdown(self):
         self.stats_manager.save_snapshot()
+        if self.state_writer is not None:
+            self.state_writer.join()
+        self.save_runtime_state()
         self.running = False
+        if self.telemetry is not None:
+            self.telemetry.stop()
+        if self.corridor_bus is not None:
+            self.corridor_bus.stop()
+        if self.detection_recorder is not None:
+            self.detection_recorder.close()
+        if self.signal_timer is not None:
+            self.signal_timer.stop()
+            r = self.signal_timer.report()
+            if r['transitions']:
+                print(f"[SEÑALES] {r['transitions']} transiciones | jitter decisión->actuación "
+                      f"p50 {r['jitter_p50_ms']:.1f} ms, p99 {r['jitter_p99_ms']:.1f} ms, máx {r['jitter_max_ms']:.1f} ms")
+        p = self.frame_pool.stats()
+        print(f"[MEMORIA] Pool de frames: {p['acquired']} usos, {p['allocated']} reservas "
+              f"({p['allocated_mb']:.1f} MB), reutilización {p['hit_rate'] * 100:.1f}%")
         cv2.destroyAllWindows()
-        for cap in self.cameras.values(): cap.release()
+        with self.camera_lock:
+            for cap in self.cameras.values(): cap.release()
 
 
 if __name__ == '__main__':
-    TrafficLightSystem().run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="AITRAFFIC - Control semafórico inteligente")
+    parser.add_argument('--record-detections', metavar='ARCHIVO',
+                        help="Graba las detecciones para re-evaluar parámetros offline con replay.py")
+    args = parser.parse_args()
+    TrafficLightSystem(record_detections=args.record_detections).run()
\ No newline at end of file
@@ -0,0 +1,100 @@
+import numpy as np
+import matplotlib.path as mplPath
+
+
+class OccupancyGrid:
+    """
+    Rejilla de ocupación de baja resolución sobre una zona (carril).
+
+    Cubre el rectángulo envolvente del polígono con celdas de `cell` píxeles; solo cuentan
+    las celdas cuyo centro cae dentro de la zona. Cada actualización marca las celdas bajo la
+    huella de los vehículos (mitad inferior de la caja, donde toca el suelo) y mezcla con el
+    estado previo con un promedio exponencial de vida media `half_life` segundos, de modo que
+    una detección perdida apenas baja la ocupación. Memoria fija: una matriz float32.
+    """
+
+    def __init__(self, zone, cell=16, half_life=2.0, stop_line='bottom'):
+        zone = np.asarray(zone, dtype=np.float64).reshape(-1, 2)
+        self.cell = cell
+        self.half_life = half_life
+        self.stop_line = stop_line
+        self.x0, self.y0 = np.floor(zone.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(zone.max(axis=0)).astype(int)
+        self.rows = max(1, -(-(y1 - self.y0) // cell))
+        self.cols = max(1, -(-(x1 - self.x0) // cell))
+
+        cy, cx = np.mgrid[0:self.rows, 0:self.cols]
+        centers = np.stack([self.x0 + (cx.ravel() + 0.5) * cell, self.y0 + (cy.ravel() + 0.5) * cell], axis=1)
+        self.mask = mplPath.Path(zone).contains_points(centers).reshape(self.rows, self.cols)
+        self.row_cells = self.mask.sum(axis=1)
+        self.total_cells = max(1, int(self.mask.sum()))
+
+        self.grid = np.zeros((self.rows, self.cols), dtype=np.float32)
+        self.last_update = None
+
+    def footprint(self, boxes):
+        """Celdas cubiertas por la huella de cada caja, marcadas en bloque con una suma acumulada 2D"""
+        covered = np.zeros((self.rows, self.cols), dtype=bool)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if len(boxes) == 0:
+            return covered
+        x, y, x2, y2 = boxes.T
+        y = (y + y2) / 2.0
+        c0 = np.clip(((x - self.x0) // self.cell).astype(int), 0, self.cols)
+        c1 = np.clip(((x2 - self.x0) // self.cell).astype(int) + 1, 0, self.cols)
+        r0 = np.clip(((y - self.y0) // self.cell).astype(int), 0, self.rows)
+        r1 = np.clip(((y2 - self.y0) // self.cell).astype(int) + 1, 0, self.rows)
+        valid = (c1 > c0) & (r1 > r0)
+        r0, r1, c0, c1 = r0[valid], r1[valid], c0[valid], c1[valid]
+
+        # Esquinas +1/-1 de cada rectángulo; bincount acumula índices repetidos
+        width = self.cols + 1
+        corners = np.concatenate([r0 * width + c0, r0 * width + c1, r1 * width + c0, r1 * width + c1])
+        signs = np.repeat([1, -1, -1, 1], len(r0))
+        diff = np.bincount(corners, signs, minlength=(self.rows + 1) * width).reshape(self.rows + 1, width)
+        covered = diff.cumsum(axis=0).cumsum(axis=1)[:self.rows, :self.cols] > 0.5
+        return covered & self.mask
+
+    def update(self, boxes, now):
+        """Mezcla la huella actual con la historia según el tiempo transcurrido"""
+        observed = self.footprint(boxes)
+        if self.last_update is None:
+            self.grid[:] = observed
+        else:
+            keep = 0.5 ** (max(0.0, now - self.last_update) / self.half_life)
+            self.grid *= keep
+            self.grid[observed] += 1.0 - keep
+        self.last_update = now
+
+    def occupancy(self):
+        """Fracción (0-1) de la zona ocupada"""
+        return float(self.grid[self.mask].sum()) / self.total_cells
+
+    def peak(self):
+        """Ocupación de la celda más ocupada: indica presencia sin depender del tamaño de la zona"""
+        return float(self.grid.max())
+
+    def queue_length(self, level=0.5):
+        """
+        Cola en píxeles: filas consecutivas desde la línea de alto con ocupación media >= level.
+        Retorna (píxeles, fracción del largo de la zona).
+        """
+        rows = np.flatnonzero(self.row_cells > 0)
+        if len(rows) == 0:
+            return 0, 0.0
+        row_occ = self.grid[rows].sum(axis=1) / self.row_cells[rows]
+        if self.stop_line == 'bottom':
+            row_occ = row_occ[::-1]
+        below = np.flatnonzero(row_occ < level)
+        n = int(below[0]) if len(below) else len(row_occ)
+        return n * self.cell, n / len(row_occ)
+
+    def heatmap(self):
+        """(x0, y0, tamaño de celda, valores con 0 fuera de la zona) para dibujar sobre el frame"""
+        return self.x0, self.y0, self.cell, np.where(self.mask, self.grid, 0.0)
+
+
+def build_grids(zone_set, cell, half_life, stop_line):
+    """Una rejilla por zona no vacía del juego de zonas ({'main': ..., 'arrow': ...})"""
+    return {k: OccupancyGrid(zone_set[k], cell, half_life, stop_line) if len(zone_set[k]) >= 3 else None
+            for k in ('main', 'arrow')}
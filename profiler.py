@@ -0,0 +1,136 @@
+import collections
+import datetime
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class SamplingProfiler:
+    """
+    Perfilador por muestreo de todos los hilos del proceso, activable en caliente.
+
+    Cada `interval` segundos toma la pila de cada hilo (sys._current_frames) y cuenta
+    pilas idénticas. Al terminar escribe un archivo en formato "collapsed stack"
+    (hilo;func (archivo:línea);... N), compatible con flamegraph.pl y speedscope.
+    Mientras está apagado no tiene ningún costo. Cada captura dura como máximo `max_duration`
+    segundos: el muestreo de todos los hilos no debe quedar como carga permanente.
+    """
+
+    def __init__(self, output_dir, interval=0.005, max_duration=120.0):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_duration = max_duration
+        self.lock = threading.Lock()
+        self.active = False
+        self.last_output = None
+
+    def clamp_duration(self, duration):
+        """Duración efectiva (recortada a max_duration); ValueError si no es un número finito positivo"""
+        duration = float(duration)
+        if not math.isfinite(duration) or duration <= 0:
+            raise ValueError(f"duración inválida: {duration}")
+        return min(duration, self.max_duration)
+
+    def start(self, duration):
+        """Inicia una captura de `duration` segundos. Retorna False si ya hay una en curso."""
+        duration = self.clamp_duration(duration)
+        with self.lock:
+            if self.active:
+                return False
+            self.active = True
+        t = threading.Thread(target=self._run, args=(duration,), name="profiler", daemon=True)
+        t.start()
+        return True
+
+    def _run(self, duration):
+        counts = collections.Counter()
+        own_ident = threading.get_ident()
+        names = {}
+        samples = 0
+        t_end = time.time() + duration
+        try:
+            while time.time() < t_end:
+                if samples % 50 == 0:
+                    # Refrescar nombres: los hilos de incidentes van y vienen
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}"))
+                    counts[';'.join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(self.interval)
+            self.last_output = self._write(counts)
+            print(f"[PERFIL] 🔥 {samples} muestras guardadas en {self.last_output}")
+        except Exception as e:
+            print(f"[PERFIL] Error durante el muestreo: {e}")
+        finally:
+            with self.lock:
+                self.active = False
+
+    def _write(self, counts):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.output_dir, f"perfil_{stamp}.folded")
+        with open(path, 'w') as f:
+            for stack, n in counts.most_common():
+                f.write(f"{stack} {n}\n")
+        return path
+
+
+def install_signal_trigger(profiler, duration, signum=None):
+    """Activa el perfilador al recibir una señal (SIGUSR1 por defecto). Solo desde el hilo principal."""
+    signum = signum if signum is not None else getattr(signal, 'SIGUSR1', None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signum, lambda *_: profiler.start(duration))
+    return True
+
+
+def start_control_server(profiler, port, default_duration, host='127.0.0.1'):
+    """
+    Endpoint local de control: GET /profile?seconds=N inicia una captura (N se recorta a
+    profiler.max_duration), GET /profile/status reporta si hay una en curso y el último archivo generado.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/profile':
+                try:
+                    seconds = profiler.clamp_duration(parse_qs(url.query).get('seconds', [default_duration])[0])
+                except ValueError:
+                    self._reply(400, f"seconds debe ser un número positivo (máx. {profiler.max_duration:g})\n")
+                    return
+                started = profiler.start(seconds)
+                self._reply(202 if started else 409,
+                            f"perfilando {seconds:g}s\n" if started else "ya hay una captura en curso\n")
+            elif url.path == '/profile/status':
+                self._reply(200, f"activo={profiler.active} ultimo={profiler.last_output}\n")
+            else:
+                self._reply(404, "rutas: /profile?seconds=N, /profile/status\n")
+
+        def _reply(self, code, text):
+            body = text.encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="profiler-control", daemon=True).start()
+    return server
@@ -0,0 +1,86 @@
+import collections
+
+
+class CaptureClock:
+    """
+    Estima la hora local de captura de cada frame a partir del timestamp de la transmisión
+    (CAP_PROP_POS_MSEC). El desfase cámara -> reloj local es el mínimo observado de
+    (hora de lectura - timestamp): el frame que llegó con menos retraso. Así la edad medida
+    incluye los frames acumulados en el buffer del decodificador cuando el lazo se atrasa.
+    Sin timestamps (webcams, pos <= 0) se usa la hora de lectura.
+    """
+
+    DRIFT = 0.001  # s/s que se deja subir el desfase para seguir la deriva del reloj de la cámara
+
+    def __init__(self):
+        self.offset = None
+        self.last_pos = None
+        self.last_read = None
+
+    def capture_time(self, pos_msec, read_time):
+        if pos_msec is None or pos_msec <= 0:
+            return read_time
+        pos = pos_msec / 1000.0
+        if self.last_pos is not None and pos < self.last_pos:
+            self.offset = None  # La transmisión se reinició (reconexión o fin de video)
+        sample = read_time - pos
+        if self.offset is None:
+            self.offset = sample
+        else:
+            self.offset = min(self.offset + self.DRIFT * (read_time - self.last_read), sample)
+        self.last_pos, self.last_read = pos, read_time
+        return pos + self.offset
+
+
+class LatencyGovernor:
+    """
+    Gobernador de calidad de servicio por cámara.
+
+    Cada `window` decisiones calcula el p90 de la edad captura -> decisión. Si supera el
+    objetivo baja un nivel (menor escala de inferencia, detección menos frecuente, menos
+    renders); si pasa `upgrade_windows` ventanas seguidas por debajo de headroom * objetivo,
+    sube un nivel. La distancia entre ambos umbrales es la histéresis.
+    """
+
+    def __init__(self, channels, levels, target, window=8, headroom=0.5, upgrade_windows=5):
+        self.levels = levels
+        self.target = target
+        self.window = window
+        self.headroom = headroom
+        self.upgrade_windows = upgrade_windows
+        self.level = {ch: 0 for ch in channels}
+        self.samples = {ch: collections.deque(maxlen=window) for ch in channels}
+        self.calm = {ch: 0 for ch in channels}
+        self.last_p90 = {ch: None for ch in channels}
+
+    def params(self, channel):
+        return self.levels[self.level[channel]]
+
+    def should_render(self, channel, frame_counter):
+        return frame_counter % self.params(channel)['render_every'] == 0
+
+    def observe(self, channel, age):
+        """Registra una edad (s). Retorna el nuevo nivel si cambió, o None."""
+        samples = self.samples[channel]
+        samples.append(age)
+        if len(samples) < self.window:
+            return None
+        p90 = sorted(samples)[int(0.9 * (len(samples) - 1))]
+        samples.clear()
+        self.last_p90[channel] = p90
+
+        level = self.level[channel]
+        if p90 > self.target:
+            self.calm[channel] = 0
+            if level < len(self.levels) - 1:
+                self.level[channel] = level + 1
+                return level + 1
+        elif p90 < self.target * self.headroom:
+            self.calm[channel] += 1
+            if level > 0 and self.calm[channel] >= self.upgrade_windows:
+                self.calm[channel] = 0
+                self.level[channel] = level - 1
+                return level - 1
+        else:
+            self.calm[channel] = 0
+        return None
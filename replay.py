@@ -0,0 +1,168 @@
+"""
+Repetición offline de detecciones grabadas con `python main.py --record-detections ARCHIVO`.
+
+Alimenta las cajas guardadas al tracker, la lógica de incidentes y el control adaptativo con
+el reloj de la grabación, sin modelo ni video, a miles de frames por segundo. Sirve para
+re-evaluar parámetros (STOP_THRESHOLD, ACCIDENT_TIME, COLLISION_DIST, OCCUPANCY_*, PHASE_TIMES...)
+sobre horas de tráfico real en minutos. Los parámetros de servicios que la repetición no ejecuta
+(temporizador de señales, corredor, telemetría...) se rechazan.
+
+Uso:
+    python replay.py grabacion.det
+    python replay.py grabacion.det --set ACCIDENT_TIME=15,20,30 --set STOP_THRESHOLD=10,15 --jobs 4
+    python replay.py grabacion.det --set MIN_CONF=0.2,0.35 --output barrido.csv
+"""
+import argparse
+import csv
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+import config as cfg
+from detection_cache import DetectionCache
+from detector import VehicleDetector
+
+CONTROL_PERIOD = 0.5  # Igual que el hilo intelligent_control
+
+# Config que solo usan servicios que la repetición no arranca (o que rompería el mapeo de cámaras)
+UNSUPPORTED = {'MIN_GREEN_TIME', 'ALL_RED_TIME', 'CAMERA_CHANNELS', 'CAMERA_NAMES', 'CAMERA_TIMEOUT',
+               'CAMERA_OPEN_TIMEOUT', 'MAX_FAILURES', 'WEBHOOK_URL', 'ZONES_FILE', 'SHOW_OCCUPANCY_HEATMAP'}
+UNSUPPORTED_PREFIXES = ('SIGNAL_', 'COORDINAT', 'TELEMETRY_', 'PROFILER_', 'STATE_', 'RECONNECT_')
+
+
+def apply_config(params):
+    """
+    Aplica a config los parámetros que viven ahí. Debe llamarse antes de construir el sistema,
+    porque __init__ lee config (rejillas de ocupación, trayectorias, QoS...). Retorna los valores previos.
+    """
+    for name in params:
+        if name in UNSUPPORTED or name.startswith(UNSUPPORTED_PREFIXES):
+            raise ValueError(f"Parámetro sin efecto en la repetición: {name}")
+    previous = {}
+    for name, value in params.items():
+        if name != 'MIN_CONF' and hasattr(cfg, name):
+            previous[name] = getattr(cfg, name)
+            setattr(cfg, name, value)
+    return previous
+
+
+def apply_system(system, params):
+    """Aplica los atributos de instancia del sistema ya construido; un nombre desconocido es un error"""
+    for name, value in params.items():
+        if name == 'MIN_CONF':
+            continue
+        if hasattr(system, name):
+            setattr(system, name, value)
+        elif not hasattr(cfg, name):
+            raise ValueError(f"Parámetro desconocido: {name}")
+
+
+def replay(path, params):
+    """Repite una grabación con un juego de parámetros y retorna sus métricas"""
+    from main import TrafficLightSystem
+
+    cache = DetectionCache(path)
+    min_conf = params.get('MIN_CONF', 0.0)
+    # Índice de cámara grabado -> canal actual; las fuentes que ya no están configuradas se omiten
+    channels = {i: src for i, src in enumerate(cache.sources) if src in cfg.CAMERA_CHANNELS}
+
+    previous = apply_config(params)
+    try:
+        # Sin frames (frame=None) las alertas solo se cuentan en system.incident_counts
+        system = TrafficLightSystem(detector=VehicleDetector(load=False), start_services=False)
+        apply_system(system, params)
+
+        base = time.time()
+        system.phase_start_time = base
+        last_control = base
+        phase_changes = 0
+        frames = 0
+        t0 = time.perf_counter()
+        for _, t, camera, rects in cache.groups(min_conf):
+            if camera not in channels:
+                continue
+            now = base + t
+            system.process_detections(channels[camera], rects, None, now=now)
+            frames += 1
+            if now - last_control >= CONTROL_PERIOD:
+                start = system.phase_start_time
+                system.intelligent_control_step(now=now)
+                phase_changes += system.phase_start_time != start
+                last_control = now
+    finally:
+        for name, value in previous.items():
+            setattr(cfg, name, value)
+    elapsed = time.perf_counter() - t0
+
+    return dict(params, frames=frames, recorded_s=cache.duration, elapsed_s=elapsed,
+                fps=frames / elapsed if elapsed > 0 else 0.0,
+                vehicles=sum(t.id_count for t in system.trackers.values()),
+                breakdowns=system.incident_counts['breakdown'], collisions=system.incident_counts['collision'],
+                phase_changes=phase_changes)
+
+
+def run_case(args):
+    path, params = args
+    # Lo que el sistema escriba en disco (CSV de estadísticas) queda en un directorio temporal
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            return replay(path, params)
+        finally:
+            os.chdir(cwd)
+
+
+def parse_sweep(items):
+    """['A=1,2', 'B=3'] -> [{'A': 1, 'B': 3}, {'A': 2, 'B': 3}]"""
+    names, values = [], []
+    for item in items:
+        name, _, raw = item.partition('=')
+        if not raw:
+            raise ValueError(f"Formato esperado NOMBRE=v1,v2: {item}")
+        names.append(name.strip())
+        values.append([float(v) if '.' in v or 'e' in v.lower() else int(v) for v in raw.split(',') if v.strip()])
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repetición offline de detecciones grabadas")
+    parser.add_argument('cache', help="Archivo grabado con main.py --record-detections")
+    parser.add_argument('--set', action='append', default=[], metavar='NOMBRE=v1,v2',
+                        help="Parámetro a barrer (atributo del sistema, de config o MIN_CONF); repetible")
+    parser.add_argument('--jobs', type=int, default=1, help="Procesos en paralelo para el barrido")
+    parser.add_argument('--output', help="CSV con una fila por combinación")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.cache)
+    cache = DetectionCache(path)
+    print(f"[REPLAY] {len(cache)} ciclos de detección, {cache.duration / 60:.1f} min grabados.")
+
+    cases = [(path, params) for params in parse_sweep(args.set)]
+    if args.jobs > 1 and len(cases) > 1:
+        with mp.Pool(args.jobs) as pool:
+            results = pool.map(run_case, cases)
+    else:
+        results = [run_case(case) for case in cases]
+
+    names = list(cases[0][1].keys())
+    columns = ['breakdowns', 'collisions', 'vehicles', 'phase_changes', 'fps']
+    print("\n" + "".join(f"{n:>16}" for n in names + columns))
+    for r in results:
+        print("".join(f"{r[n]:>16g}" for n in names) +
+              "".join(f"{r[c]:>16.0f}" for c in columns))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"\nResultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import collections
+import threading
+import time
+
+try:
+    # Solo necesario para el gabinete real por puerto serie
+    import serial
+except ImportError:
+    serial = None
+
+COLOR_CODES = {'red': 0, 'yellow': 1, 'green': 2}
+STX, ETX, ACK = 0x02, 0x03, 0x06
+EPS = 1e-6  # Tolerancia de redondeo al comparar tiempos
+
+
+class SignalDriver:
+    """Interfaz de salida hacia el controlador de semáforos. Las cabezas son tuplas (canal, 'main'|'arrow')."""
+
+    def open(self):
+        pass
+
+    def apply(self, states, timestamp):
+        """Envía el estado completo de todas las cabezas. Retorna True si el gabinete lo confirmó."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SimulatedCabinet(SignalDriver):
+    """
+    Gabinete local para pruebas: guarda cada trama aplicada, simula la demora de actuación
+    y hace de monitor de conflictos (como la MMU de un gabinete real): si dos cabezas de
+    grupos distintos quedan en verde/amarillo a la vez registra una falla.
+    """
+
+    def __init__(self, groups, latency=0.0, history=1000):
+        self.group_of = {h: i for i, g in enumerate(groups) for h in g}
+        self.latency = latency
+        self.frames = collections.deque(maxlen=history)
+        self.faults = []
+
+    def apply(self, states, timestamp):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        active = {self.group_of.get(h) for h, c in states.items() if c != 'red'}
+        if len(active) > 1:
+            self.faults.append((timestamp, dict(states)))
+            print(f"[GABINETE] ❌ CONFLICTO: grupos {sorted(g for g in active if g is not None)} activos a la vez")
+        self.frames.append((timestamp, dict(states)))
+        return True
+
+
+class SerialSignalDriver(SignalDriver):
+    """
+    Driver por puerto serie con tramas estilo NTCIP (estado completo en cada trama):
+    STX | seq | n | color por cabeza (0 rojo, 1 amarillo, 2 verde) | XOR | ETX.
+    El gabinete responde ACK + seq; sin respuesta se reintenta.
+    """
+
+    def __init__(self, port, baudrate, heads, timeout=0.1, retries=2):
+        self.port = port
+        self.baudrate = baudrate
+        self.heads = list(heads)  # Orden de las cabezas en la trama = cableado del gabinete
+        self.timeout = timeout
+        self.retries = retries
+        self.seq = 0
+        self.conn = None
+
+    def open(self):
+        if serial is None:
+            raise RuntimeError("pyserial no está instalado (pip install pyserial)")
+        self.conn = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
+
+    def encode(self, states):
+        body = bytes([self.seq, len(self.heads)] + [COLOR_CODES[states.get(h, 'red')] for h in self.heads])
+        checksum = 0
+        for b in body:
+            checksum ^= b
+        return bytes([STX]) + body + bytes([checksum, ETX])
+
+    def apply(self, states, timestamp):
+        self.seq = (self.seq + 1) % 256
+        frame = self.encode(states)
+        for _ in range(self.retries + 1):
+            self.conn.write(frame)
+            reply = self.conn.read(2)
+            if len(reply) == 2 and reply[0] == ACK and reply[1] == self.seq:
+                return True
+        print(f"[SEÑALES] ⚠️ El gabinete no confirmó la trama {self.seq}")
+        return False
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SignalTimer:
+    """
+    Hilo de temporización entre las decisiones del control y el driver de salida.
+
+    El control pide colores por cabeza (request); este hilo los aplica en ticks fijos respetando
+    verde mínimo, amarillo obligatorio entre verde y rojo, y despeje en rojo total antes de dar
+    verde a un grupo en conflicto. Cada transición queda con su marca de tiempo y su jitter:
+    demora entre el momento en que se podía actuar (pedido + restricciones) y la confirmación
+    del driver.
+
+    Una transición solo se da por hecha cuando el driver confirma la trama; si no la confirma
+    (o falla) el estado no cambia y la trama completa se reenvía en el siguiente tick. Tras
+    `fault_after` fallas seguidas se declara falla (fault = True, on_fault): el gabinete real
+    debe pasar a destello por su cuenta al perder el enlace.
+    """
+
+    def __init__(self, driver, groups, min_green, yellow_time, all_red_time, tick=0.02, on_change=None,
+                 fault_after=3, on_fault=None):
+        self.driver = driver
+        self.groups = [set(g) for g in groups]
+        self.group_of = {h: i for i, g in enumerate(self.groups) for h in g}
+        self.min_green = min_green
+        self.yellow_time = yellow_time
+        self.all_red_time = all_red_time
+        self.tick = tick
+        self.on_change = on_change
+        self.fault_after = fault_after
+        self.on_fault = on_fault
+        self.failures = 0
+        self.apply_failures = 0
+        self.fault = False
+
+        heads = list(self.group_of)
+        self.current = {h: 'red' for h in heads}
+        self.desired = dict(self.current)
+        self.requested_at = {h: 0.0 for h in heads}
+        self.changed_at = {h: float('-inf') for h in heads}
+
+        self.lock = threading.Lock()
+        self.transitions = collections.deque(maxlen=500)
+        self.jitter = collections.deque(maxlen=2000)
+        self.tick_lateness = collections.deque(maxlen=2000)
+        self.running = False
+        self.thread = None
+
+    def request(self, states, now=None):
+        """Pide colores para algunas cabezas; las demás conservan su último pedido"""
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            for head, color in states.items():
+                if head in self.desired and self.desired[head] != color:
+                    self.desired[head] = color
+                    self.requested_at[head] = now
+
+    def _conflicts_clear(self, head, now):
+        """Momento desde el que los grupos en conflicto llevan despeje en rojo (None si aún hay alguno activo)"""
+        release = float('-inf')
+        group = self.group_of[head]
+        for other, color in self.current.items():
+            if self.group_of[other] == group:
+                continue
+            if color != 'red':
+                return None
+            release = max(release, self.changed_at[other] + self.all_red_time)
+        return release
+
+    def _next(self, head, now):
+        """(color siguiente, momento desde el que era posible) o None si aún no corresponde"""
+        cur, want = self.current[head], self.desired[head]
+        since = self.changed_at[head]
+        if cur == 'green':
+            release = since + self.min_green
+            return ('yellow', release) if now + EPS >= release else None
+        if cur == 'yellow':
+            release = since + self.yellow_time
+            return ('red', release) if now + EPS >= release else None
+        if want == 'green':
+            release = self._conflicts_clear(head, now)
+            if release is None or now + EPS < release:
+                return None
+            # Si la cabeza venía de su propio amarillo, no pudo actuar antes de quedar en rojo
+            return 'green', max(release, since)
+        return None  # rojo -> amarillo no existe: un pedido de amarillo sobre rojo queda en rojo
+
+    def step(self, now=None):
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            changes = []
+            for head in self.current:
+                if self.current[head] == self.desired[head]:
+                    continue
+                nxt = self._next(head, now)
+                if nxt is None:
+                    continue
+                color, release = nxt
+                changes.append((head, color, max(release, self.requested_at[head])))
+            # Dos grupos en conflicto nunca reciben verde en el mismo tick
+            greens = {self.group_of[h] for h, c, _ in changes if c == 'green'}
+            if len(greens) > 1:
+                keep = min(greens)
+                changes = [ch for ch in changes if ch[1] != 'green' or self.group_of[ch[0]] == keep]
+            if not changes:
+                return
+            states = dict(self.current)
+            for head, color, _ in changes:
+                states[head] = color
+
+        # El estado se confirma solo si el gabinete aceptó la trama
+        wall = time.time()
+        t_apply = time.monotonic()
+        try:
+            confirmed = self.driver.apply(states, wall)
+        except Exception as e:
+            print(f"[SEÑALES] Error aplicando estados: {e}")
+            confirmed = False
+        if not confirmed:
+            self._apply_failed()
+            return
+        actuated = now + (time.monotonic() - t_apply)
+
+        with self.lock:
+            for head, color, ready in changes:
+                self.current[head] = color
+                self.changed_at[head] = now
+                self.transitions.append((wall, head, color))
+                self.jitter.append(actuated - ready)
+            self.failures = 0
+            if self.fault:
+                self.fault = False
+                print("[SEÑALES] ✅ Gabinete confirmando tramas otra vez")
+        if self.on_change is not None:
+            self.on_change(states)
+
+    def _apply_failed(self):
+        with self.lock:
+            self.failures += 1
+            self.apply_failures += 1
+            raise_fault = not self.fault and self.failures >= self.fault_after
+            if raise_fault:
+                self.fault = True
+        if raise_fault:
+            print(f"[SEÑALES] ❌ FALLA: {self.failures} tramas sin confirmar; el gabinete debe quedar en destello")
+            if self.on_fault is not None:
+                self.on_fault(self.failures)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self.running:
+            now = time.monotonic()
+            self.tick_lateness.append(max(0.0, now - next_tick))
+            try:
+                self.step(now)
+            except Exception as e:
+                print(f"[SEÑALES] Error aplicando estados: {e}")
+            next_tick += self.tick
+            if next_tick < time.monotonic():
+                next_tick = time.monotonic()  # Atrasado: no intentar recuperar ticks perdidos
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def start(self):
+        self.driver.open()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="signal-timer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(1.0)
+        self.driver.close()
+
+    def report(self):
+        """Resumen de transiciones y jitter decisión -> actuación (ms)"""
+
+        def pct(values, q):
+            values = sorted(values)
+            return values[int(q * (len(values) - 1))] * 1000 if values else None
+
+        jitter = list(self.jitter)
+        return {'transitions': len(self.transitions), 'fault': self.fault, 'apply_failures': self.apply_failures,
+                'jitter_p50_ms': pct(jitter, 0.5),
+                'jitter_p99_ms': pct(jitter, 0.99), 'jitter_max_ms': max(jitter) * 1000 if jitter else None,
+                'tick_late_p99_ms': pct(list(self.tick_lateness), 0.99)}
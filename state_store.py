@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+import time
+
+
+def atomic_write_json(path, data):
+    """
+    Escribe JSON de forma atómica: archivo temporal en el mismo directorio + os.replace.
+    Un corte de energía deja el archivo anterior o el nuevo, nunca uno a medias.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(data, tmp, separators=(',', ':'))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_state(path, state):
+    """Guarda el snapshot del estado en ejecución con su marca de tiempo"""
+    atomic_write_json(path, {'saved_at': time.time(), 'state': state})
+
+
+def load_state(path, max_age):
+    """
+    Lee el snapshot guardado.
+
+    Returns:
+        (state, edad_en_segundos) o (None, None) si no existe, está corrupto o es más viejo que max_age.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        age = time.time() - float(data['saved_at'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+    if age < 0 or age > max_age:
+        return None, None
+    return data['state'], age
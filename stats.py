@@ -14,6 +14,9 @@ class StatsManager:
         # Estructura: { 'Camara Norte': 0, ... }
         self.vehicle_counts = {name: 0 for name in cfg.CAMERA_NAMES}
         self.incident_counts = {name: 0 for name in cfg.CAMERA_NAMES}
+        # Velocidad media de aproximación (m/s), suavizada; None si la cámara no está calibrada
+        self.approach_speeds = {name: None for name in cfg.CAMERA_NAMES}
+        self.speed_smoothing = 0.2
 
         # Control de tiempo para guardado periódico (cada minuto)
         self.last_save_time = time.time()
@@ -37,6 +40,14 @@ class StatsManager:
         if total_tracker_id > self.vehicle_counts[camera_name]:
             self.vehicle_counts[camera_name] = total_tracker_id
 
+    def update_speed(self, camera_name, mean_speed):
+        """Media móvil exponencial de la velocidad de aproximación"""
+        prev = self.approach_speeds[camera_name]
+        if prev is None:
+            self.approach_speeds[camera_name] = mean_speed
+        else:
+            self.approach_speeds[camera_name] = prev + self.speed_smoothing * (mean_speed - prev)
+
     def log_incident(self, camera_name):
         """Registra un nuevo incidente"""
         self.incident_counts[camera_name] += 1
@@ -73,8 +84,24 @@ class StatsManager:
         except Exception as e:
             print(f"[STATS] Error guardando CSV: {e}")
 
+    def get_state(self):
+        """Contadores en memoria para el snapshot de reinicio en caliente"""
+        return {'vehicle_counts': dict(self.vehicle_counts), 'incident_counts': dict(self.incident_counts)}
+
+    def parse_state(self, state):
+        """Valida un snapshot de get_state(); retorna (vehículos, incidentes) sin tocar los contadores"""
+        vehicles = {name: int(state['vehicle_counts'].get(name, 0)) for name in cfg.CAMERA_NAMES}
+        incidents = {name: int(state['incident_counts'].get(name, 0)) for name in cfg.CAMERA_NAMES}
+        return vehicles, incidents
+
+    def restore_state(self, state):
+        vehicles, incidents = self.parse_state(state)
+        for name in cfg.CAMERA_NAMES:
+            self.vehicle_counts[name] = max(self.vehicle_counts[name], vehicles[name])
+            self.incident_counts[name] = max(self.incident_counts[name], incidents[name])
+
     def get_dashboard_data(self):
         """Retorna datos para pintar en el visualizador"""
         total_cars = sum(self.vehicle_counts.values())
         total_incidents = sum(self.incident_counts.values())
-        return self.vehicle_counts, total_cars, total_incidents
\ No newline at end of file
+        return self.vehicle_counts, total_cars, total_incidents, self.approach_speeds
\ No newline at end of file
@@ -0,0 +1,225 @@
+import collections
+import gzip
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import state_store
+
+RECORD_HEADER = struct.Struct('<I')  # Longitud del payload comprimido
+
+
+class SpoolQueue:
+    """
+    Cola en disco de solo-anexado para guardar lotes mientras no hay enlace.
+
+    queue.bin contiene registros [longitud u32][payload]; queue.offset guarda la posición
+    del primer registro aún no confirmado. Al vaciarse la cola se trunca el archivo.
+    """
+
+    def __init__(self, folder, max_bytes):
+        os.makedirs(folder, exist_ok=True)
+        self.data_path = os.path.join(folder, "queue.bin")
+        self.offset_path = os.path.join(folder, "queue.offset")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.offset = 0
+        self._recover()
+
+    def _recover(self):
+        """Descarta un registro final a medio escribir (corte de energía) y valida el offset"""
+        if not os.path.exists(self.data_path):
+            open(self.data_path, 'wb').close()
+        try:
+            with open(self.offset_path) as f:
+                self.offset = int(json.load(f)['offset'])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.offset = 0
+
+        size = os.path.getsize(self.data_path)
+        valid_end = 0
+        with open(self.data_path, 'rb') as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                (length,) = RECORD_HEADER.unpack(header)
+                if valid_end + RECORD_HEADER.size + length > size:
+                    break
+                f.seek(length, os.SEEK_CUR)
+                valid_end += RECORD_HEADER.size + length
+        if valid_end < size:
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(valid_end)
+        if self.offset > valid_end:
+            self.offset = 0
+
+    def size(self):
+        return os.path.getsize(self.data_path)
+
+    def append(self, payload):
+        with self.lock:
+            if self.size() - self.offset + len(payload) > self.max_bytes:
+                return False
+            with open(self.data_path, 'ab') as f:
+                f.write(RECORD_HEADER.pack(len(payload)) + payload)
+                f.flush()
+                os.fsync(f.fileno())
+            return True
+
+    def peek(self):
+        """Primer registro pendiente: (payload, offset_siguiente) o None si la cola está vacía"""
+        with self.lock:
+            with open(self.data_path, 'rb') as f:
+                f.seek(self.offset)
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return None
+                (length,) = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+            return payload, self.offset + RECORD_HEADER.size + length
+
+    def commit(self, next_offset):
+        """Confirma el envío hasta next_offset; compacta cuando ya no queda nada pendiente"""
+        with self.lock:
+            if next_offset >= self.size():
+                with open(self.data_path, 'r+b') as f:
+                    f.truncate(0)
+                next_offset = 0
+            self.offset = next_offset
+            state_store.atomic_write_json(self.offset_path, {'offset': self.offset})
+
+    def pending_bytes(self):
+        return self.size() - self.offset
+
+
+class TelemetryUplink:
+    """
+    Enlace de telemetría de tipo store-and-forward.
+
+    Cada intervalo arma un lote (conteos del intervalo, salud de cámaras y eventos de fase e
+    incidentes), lo comprime con gzip y lo anexa a la cola en disco. Después intenta vaciar la
+    cola en orden sobre una conexión HTTP reutilizada, respetando un límite de lotes por segundo.
+    Si el enlace cae, los lotes quedan en disco hasta que vuelva.
+    """
+
+    def __init__(self, url, interval, spool_dir, max_rate, timeout=10.0, max_spool_bytes=50 * 1024 * 1024,
+                 snapshot_source=None):
+        self.url = url
+        self.interval = interval
+        self.min_send_gap = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.timeout = timeout
+        self.snapshot_source = snapshot_source
+        self.spool = SpoolQueue(spool_dir, max_spool_bytes)
+
+        # Sesión con pool de una conexión keep-alive; los reintentos los maneja la cola
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+        self.events = collections.deque(maxlen=1000)
+        self.events_lock = threading.Lock()
+        self.last_counts = None
+        # (boot, seq) identifica cada lote de forma única aunque el proceso se reinicie;
+        # aleatorio para que dos reinicios en el mismo segundo no repitan identificador
+        self.boot_id = uuid.uuid4().hex
+        self.batch_seq = 0
+        self.last_send_time = 0.0
+        self.link_up = True
+
+        self.running = False
+        self.thread = None
+
+    def record_event(self, kind, data):
+        """Encola un evento (fase, incidente, cámara...) para el siguiente lote"""
+        with self.events_lock:
+            self.events.append({'t': time.time(), 'type': kind, **data})
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def stop(self, flush=True):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(self.timeout + 1.0)
+        if flush:
+            self.enqueue_batch()
+            self.drain()
+
+    def build_batch(self):
+        with self.events_lock:
+            events = list(self.events)
+            self.events.clear()
+
+        batch = {'boot': self.boot_id, 'seq': self.batch_seq, 'created_at': time.time(), 'interval': self.interval,
+                 'events': events}
+        if self.snapshot_source is not None:
+            snapshot = self.snapshot_source()
+            counts = snapshot.get('vehicle_counts', {})
+            # Conteos del intervalo: diferencia contra el lote anterior
+            if self.last_counts is not None:
+                batch['counts'] = {k: v - self.last_counts.get(k, 0) for k, v in counts.items()}
+            else:
+                batch['counts'] = {k: 0 for k in counts}
+            self.last_counts = dict(counts)
+            batch['totals'] = counts
+            batch['incidents'] = snapshot.get('incident_counts', {})
+            batch['cameras'] = snapshot.get('cameras', {})
+        self.batch_seq += 1
+        return batch
+
+    def enqueue_batch(self):
+        payload = gzip.compress(json.dumps(self.build_batch(), separators=(',', ':')).encode('utf-8'))
+        if not self.spool.append(payload):
+            print("[TELEMETRIA] ⚠️ Cola en disco llena, lote descartado.")
+
+    def drain(self):
+        """Envía los lotes pendientes en orden; se detiene en el primer fallo"""
+        while True:
+            item = self.spool.peek()
+            if item is None:
+                return True
+            payload, next_offset = item
+
+            wait = self.min_send_gap - (time.time() - self.last_send_time)
+            if wait > 0:
+                time.sleep(wait)
+            self.last_send_time = time.time()
+
+            try:
+                response = self.session.post(self.url, data=payload, timeout=self.timeout,
+                                             headers={'Content-Type': 'application/json',
+                                                      'Content-Encoding': 'gzip'})
+                ok = 200 <= response.status_code < 300
+            except requests.RequestException:
+                ok = False
+
+            if not ok:
+                if self.link_up:
+                    print(f"[TELEMETRIA] ❌ Enlace caído; {self.spool.pending_bytes()} bytes en cola.")
+                self.link_up = False
+                return False
+            if not self.link_up:
+                print("[TELEMETRIA] ✅ Enlace restablecido, vaciando cola.")
+            self.link_up = True
+            self.spool.commit(next_offset)
+
+    def _run(self):
+        next_batch = time.time() + self.interval
+        while self.running:
+            if time.time() >= next_batch:
+                self.enqueue_batch()
+                next_batch += self.interval
+                self.drain()
+                if next_batch < time.time():
+                    # El envío tardó más de un intervalo: no acumular lotes vacíos
+                    next_batch = time.time() + self.interval
+            time.sleep(min(1.0, max(0.0, next_batch - time.time())))
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Los módulos del proyecto viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: prueba de decenas de segundos (procesos y red local); '
+                                       'se omite con -m "not slow"')
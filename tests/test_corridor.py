@@ -0,0 +1,9 @@
+import pytest
+
+import corridor_sim
+
+
+@pytest.mark.slow
+def test_green_wave_converges_through_control_loop():
+    # Tres nodos: el del medio salta la fase 2 y el último la fase 0 (ajuste en la fase 3)
+    assert corridor_sim.run_corridor(n_nodes=3, base_port=47930)
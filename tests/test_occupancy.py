@@ -0,0 +1,43 @@
+import pytest
+
+import config as cfg
+from detector import VehicleDetector
+from main import TrafficLightSystem
+
+# Dos carriles contiguos: recto a la izquierda de x=200, flecha a la derecha
+MAIN_ZONE = [[0, 0], [200, 0], [200, 300], [0, 300]]
+ARROW_ZONE = [[200, 0], [400, 0], [400, 300], [200, 300]]
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # El sistema lee zonas.json y escribe el registro CSV en el directorio actual
+    monkeypatch.chdir(tmp_path)
+
+
+def make_system():
+    system = TrafficLightSystem(detector=VehicleDetector(load=False), start_services=False)
+    channel = cfg.CAMERA_CHANNELS[cfg.ESTE_IDX]
+    system.live_zones[channel] = system.compile_zone_set(MAIN_ZONE, ARROW_ZONE)
+    return system, channel
+
+
+def test_box_overlapping_neighbour_lane_only_counts_in_its_own():
+    system, channel = make_system()
+    # Centro (160, 200) en el carril recto; la caja invade la flecha hasta x=230
+    for t in (0.0, 0.5, 1.0):
+        system.process_detections(channel, [[90, 150, 230, 250]], now=t)
+
+    occ = system.lane_occupancy[channel]
+    assert occ['main']['peak'] > cfg.OCCUPANCY_PRESENCE
+    assert occ['arrow']['peak'] == 0.0
+    assert system.has_vehicles(channel, 'any')
+    assert not system.has_vehicles(channel, 'arrow')
+
+
+def test_arrow_lane_car_is_present():
+    system, channel = make_system()
+    system.process_detections(channel, [[250, 150, 350, 250]], now=0.0)
+    assert system.lane_occupancy[channel]['arrow']['peak'] == 1.0
+    assert system.lane_occupancy[channel]['main']['peak'] == 0.0
+    assert system.has_vehicles(channel, 'arrow')
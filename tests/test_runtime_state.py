@@ -0,0 +1,61 @@
+import pytest
+
+import config as cfg
+import state_store
+from detector import VehicleDetector
+from main import TrafficLightSystem
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Snapshot, registro CSV y zonas.json quedan en un directorio temporal
+    monkeypatch.chdir(tmp_path)
+
+
+def make_system():
+    return TrafficLightSystem(detector=VehicleDetector(load=False), start_services=False)
+
+
+def saved_state():
+    """Snapshot de un sistema con fase, luces, tracker y vehículos distintos a los de arranque"""
+    system = make_system()
+    channel = cfg.CAMERA_CHANNELS[cfg.ESTE_IDX]
+    system.process_detections(channel, [[100, 300, 140, 330], [200, 300, 240, 330]], now=0.0)
+    system.current_phase = 2
+    system.phase_duration = 7.5
+    system.traffic_states[cfg.CAMERA_CHANNELS[cfg.NORTE_IDX]] = 'green'
+    system.save_runtime_state()
+    return channel, state_store.load_state(cfg.STATE_FILE, cfg.STATE_MAX_AGE)[0]
+
+
+def test_valid_snapshot_is_restored():
+    channel, _ = saved_state()
+    system = make_system()
+    system.restore_runtime_state()
+    assert system.state_restored
+    assert (system.current_phase, system.phase_duration) == (2, 7.5)
+    assert system.traffic_states[cfg.CAMERA_CHANNELS[cfg.NORTE_IDX]] == 'green'
+    assert system.trackers[channel].id_count == 2
+    assert len(system.vehicle_data[channel].ids) == 2
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda s: s['vehicles'].pop(str(cfg.CAMERA_CHANNELS[-1])),
+    lambda s: s['zones'].pop(str(cfg.CAMERA_CHANNELS[-1])),
+    lambda s: s['stats'].pop('incident_counts'),
+    lambda s: s['arrow_states'].__setitem__(str(cfg.CAMERA_CHANNELS[-1]), 'azul'),
+])
+def test_partial_snapshot_leaves_live_state_untouched(corrupt):
+    channel, state = saved_state()
+    corrupt(state)
+    state_store.save_state(cfg.STATE_FILE, state)
+
+    system = make_system()
+    trackers, zones = dict(system.trackers), dict(system.live_zones)
+    system.restore_runtime_state()
+    assert not system.state_restored
+    assert (system.current_phase, system.phase_duration) == (0, cfg.PHASE_TIMES[0])
+    assert all(c == 'red' for c in system.traffic_states.values())
+    assert system.trackers == trackers and system.live_zones == zones
+    assert system.trackers[channel].id_count == 0
+    assert len(system.vehicle_data[channel].ids) == 0
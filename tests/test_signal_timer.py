@@ -0,0 +1,137 @@
+import random
+
+import pytest
+
+from signal_driver import EPS, SignalTimer, SimulatedCabinet
+
+MIN_GREEN = 5.0
+YELLOW = 3.0
+ALL_RED = 1.0
+TICK = 0.02
+
+# Tres grupos en conflicto; el grupo 0 tiene dos cabezas (recto + flecha)
+GROUPS = [[(1, 'main'), (1, 'arrow')], [(2, 'main')], [(3, 'main')]]
+
+
+class FlakyCabinet(SimulatedCabinet):
+    """Gabinete que no confirma mientras `down` sea True"""
+
+    def __init__(self, groups):
+        super().__init__(groups)
+        self.down = False
+        self.sent = 0
+
+    def apply(self, states, timestamp):
+        self.sent += 1
+        if self.down:
+            return False
+        return super().apply(states, timestamp)
+
+
+def make_timer(driver):
+    return SignalTimer(driver, GROUPS, MIN_GREEN, YELLOW, ALL_RED, TICK)
+
+
+def run(timer, until, now=0.0, requests=None):
+    """Avanza el reloj simulado en ticks; registra (t, cabeza, anterior, nuevo) por cada cambio"""
+    log = []
+    requests = dict(requests or {})
+    while now < until:
+        if requests and min(requests) <= now:
+            timer.request(requests.pop(min(requests)), now)
+        before = dict(timer.current)
+        timer.step(now)
+        log += [(now, h, before[h], c) for h, c in timer.current.items() if c != before[h]]
+        now = round(now + TICK, 6)
+    return log, now
+
+
+def check_intervals(log):
+    """Verde mínimo, amarillo obligatorio y despeje en rojo total en una secuencia de cambios"""
+    group_of = {h: i for i, g in enumerate(GROUPS) for h in g}
+    since = {h: (float('-inf'), 'red') for h in group_of}
+    state = {h: 'red' for h in group_of}
+    for t, head, old, new in log:
+        start, color = since[head]
+        assert color == old
+        assert (old, new) in {('red', 'green'), ('green', 'yellow'), ('yellow', 'red')}, (t, head, old, new)
+        if old == 'green':
+            assert t - start >= MIN_GREEN - EPS, (t, head)
+        if old == 'yellow':
+            assert t - start >= YELLOW - EPS, (t, head)
+        if new == 'green':
+            for other, c in state.items():
+                if group_of[other] != group_of[head]:
+                    assert c == 'red', (t, head, other)
+                    assert t - since[other][0] >= ALL_RED - EPS or since[other][0] == float('-inf'), (t, head, other)
+        since[head] = (t, new)
+        state[head] = new
+
+
+def test_phase_sequence_respects_intervals():
+    cabinet = SimulatedCabinet(GROUPS)
+    timer = make_timer(cabinet)
+    requests = {
+        0.0: {(1, 'main'): 'green', (1, 'arrow'): 'green'},
+        # Pedido de cambio antes de cumplir el verde mínimo
+        2.0: {(1, 'main'): 'red', (1, 'arrow'): 'red', (2, 'main'): 'green'},
+        20.0: {(2, 'main'): 'red', (3, 'main'): 'green'},
+    }
+    log, _ = run(timer, 40.0, requests=requests)
+    check_intervals(log)
+    assert cabinet.faults == []
+
+    changes = {(h, new): t for t, h, _, new in log}
+    assert changes[((1, 'main'), 'yellow')] == pytest.approx(MIN_GREEN)
+    assert changes[((1, 'main'), 'red')] == pytest.approx(MIN_GREEN + YELLOW)
+    assert changes[((2, 'main'), 'green')] == pytest.approx(MIN_GREEN + YELLOW + ALL_RED)
+    assert timer.current[(3, 'main')] == 'green'
+
+
+def test_random_requests_never_conflict():
+    rng = random.Random(0)
+    cabinet = SimulatedCabinet(GROUPS)
+    timer = make_timer(cabinet)
+    requests = {}
+    t = 0.0
+    while t < 300.0:
+        t = round(t + rng.uniform(0.1, 8.0), 2)
+        green = rng.randrange(len(GROUPS))
+        requests[t] = {h: ('green' if i == green else 'red') for i, g in enumerate(GROUPS) for h in g}
+    log, _ = run(timer, 320.0, requests=requests)
+    assert len(log) > 20
+    check_intervals(log)
+    assert cabinet.faults == []
+
+
+def test_unconfirmed_frame_is_not_committed_and_resent():
+    cabinet = FlakyCabinet(GROUPS)
+    timer = make_timer(cabinet)
+    faults = []
+    timer.on_fault = faults.append
+    cabinet.down = True
+    timer.request({(2, 'main'): 'green'}, 0.0)
+
+    log, now = run(timer, 1.0)
+    assert log == []
+    assert timer.current[(2, 'main')] == 'red'
+    assert timer.fault and faults == [timer.fault_after]
+    assert cabinet.sent == round(1.0 / TICK)  # La trama completa se reenvía cada tick
+
+    cabinet.down = False
+    log, _ = run(timer, 2.0, now)
+    assert [(h, new) for _, h, _, new in log] == [((2, 'main'), 'green')]
+    assert not timer.fault
+    assert timer.report()['apply_failures'] == round(1.0 / TICK)
+
+
+def test_driver_exception_counts_as_unconfirmed():
+    class BrokenCabinet(SimulatedCabinet):
+        def apply(self, states, timestamp):
+            raise OSError("puerto cerrado")
+
+    timer = make_timer(BrokenCabinet(GROUPS))
+    timer.request({(3, 'main'): 'green'}, 0.0)
+    log, _ = run(timer, 0.2)
+    assert log == []
+    assert timer.fault
@@ -0,0 +1,107 @@
+import gzip
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from telemetry import RECORD_HEADER, SpoolQueue, TelemetryUplink
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        code = server.responses.pop(0) if server.responses else 200
+        if code == 200:
+            server.received.append(json.loads(gzip.decompress(payload)))
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    """Servidor local: responde los códigos de `responses` en orden y después 200"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.responses = []
+    server.received = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_uplink(stub, folder):
+    url = f"http://127.0.0.1:{stub.server_address[1]}/telemetria"
+    return TelemetryUplink(url, 60.0, str(folder), max_rate=1000.0, timeout=2.0)
+
+
+def read_offset(folder):
+    with open(os.path.join(folder, "queue.offset")) as f:
+        return json.load(f)['offset']
+
+
+def test_batches_spool_while_down_and_drain_in_order(stub, tmp_path):
+    uplink = make_uplink(stub, tmp_path)
+    stub.responses = [503] * 3
+    for i in range(3):
+        uplink.record_event('fase', {'phase': i})
+        uplink.enqueue_batch()
+        assert uplink.drain() is False
+    assert not uplink.link_up
+    assert stub.received == []
+    assert uplink.spool.pending_bytes() == uplink.spool.size() > 0
+
+    assert uplink.drain() is True
+    assert [b['seq'] for b in stub.received] == [0, 1, 2]
+    assert [b['events'][0]['phase'] for b in stub.received] == [0, 1, 2]
+    assert len({b['boot'] for b in stub.received}) == 1
+    # Cola vacía: archivo compactado y offset confirmado en disco
+    assert uplink.spool.size() == 0
+    assert read_offset(tmp_path) == 0
+
+
+def test_offset_survives_restart_mid_drain(stub, tmp_path):
+    uplink = make_uplink(stub, tmp_path)
+    stub.responses = [503]
+    for _ in range(3):
+        uplink.enqueue_batch()
+    assert uplink.drain() is False
+    first_end = uplink.spool.peek()[1]
+
+    # El primer lote pasa y el enlace vuelve a caer antes del segundo
+    stub.responses = [200, 503]
+    assert uplink.drain() is False
+    assert read_offset(tmp_path) == first_end
+    assert uplink.spool.size() > first_end
+
+    # Un proceso nuevo retoma desde el offset confirmado, sin reenviar el lote 0
+    restarted = make_uplink(stub, tmp_path)
+    assert restarted.spool.offset == first_end
+    assert restarted.boot_id != uplink.boot_id
+    assert restarted.drain() is True
+    assert [b['seq'] for b in stub.received] == [0, 1, 2]
+    assert restarted.spool.size() == 0
+
+
+def test_recover_drops_half_written_record(tmp_path):
+    spool = SpoolQueue(str(tmp_path), 1024 * 1024)
+    spool.append(b'primero')
+    spool.append(b'segundo')
+    complete = spool.size()
+    # Corte de energía a mitad de un anexado: cabecera completa, payload incompleto
+    with open(spool.data_path, 'ab') as f:
+        f.write(RECORD_HEADER.pack(100) + b'tercero')
+
+    recovered = SpoolQueue(str(tmp_path), 1024 * 1024)
+    assert recovered.size() == complete
+    payload, next_offset = recovered.peek()
+    assert payload == b'primero'
+    recovered.commit(next_offset)
+    assert recovered.peek()[0] == b'segundo'
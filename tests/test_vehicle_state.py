@@ -0,0 +1,192 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from vehicle_state import VehicleStateTable
+
+STOP_THRESHOLD = 15
+ACCIDENT_TIME = 20.0
+COLLISION_DIST = 100
+
+
+class DictReference:
+    """
+    Algoritmo anterior por diccionario (update_vehicle_status / check_collisions de main.py
+    antes del formato columnar), usado como referencia de la semántica de incidentes.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def update(self, tracked, current_time, in_arrow, main_light, arrow_light):
+        alerts = []
+        active_ids = []
+        for (x, y, x2, y2, vid), arrow in zip(tracked, in_arrow):
+            cx, cy = (x + x2) // 2, (y + y2) // 2
+            active_ids.append(vid)
+            if vid not in self.data:
+                self.data[vid] = {'last_pos': (cx, cy), 'accumulated_time': 0.0, 'last_update_time': current_time,
+                                  'incident_type': 'none', 'alert_sent': False, 'lane_type': 'unknown'}
+                continue
+            data = self.data[vid]
+            dist = math.hypot(cx - data['last_pos'][0], cy - data['last_pos'][1])
+            dt = current_time - data['last_update_time']
+            light = arrow_light if arrow else main_light
+            data['lane_type'] = 'arrow' if arrow else 'main'
+            if dist > STOP_THRESHOLD:
+                data['accumulated_time'] = 0.0
+                data['incident_type'] = 'none'
+                data['alert_sent'] = False
+            elif light == 'green':
+                data['accumulated_time'] += dt
+                if data['accumulated_time'] > ACCIDENT_TIME:
+                    if data['incident_type'] == 'none':
+                        data['incident_type'] = 'breakdown'
+                    if not data['alert_sent']:
+                        alerts.append((vid, data['accumulated_time'], data['incident_type']))
+                        data['alert_sent'] = True
+            data['last_pos'] = (cx, cy)
+            data['last_update_time'] = current_time
+        for vid in list(self.data):
+            if vid not in active_ids:
+                del self.data[vid]
+        return alerts
+
+    def check_collisions(self):
+        stopped = [(vid, d['last_pos']) for vid, d in self.data.items() if d['accumulated_time'] > ACCIDENT_TIME]
+        for i in range(len(stopped)):
+            for j in range(i + 1, len(stopped)):
+                (id1, p1), (id2, p2) = stopped[i], stopped[j]
+                if math.hypot(p1[0] - p2[0], p1[1] - p2[1]) < COLLISION_DIST:
+                    self.data[id1]['incident_type'] = 'collision'
+                    self.data[id2]['incident_type'] = 'collision'
+
+
+def step(table, ref, tracked, t, in_arrow=None, main_light='green', arrow_light='red'):
+    """Misma actualización en ambos; retorna las alertas de cada uno"""
+    in_arrow = list(in_arrow) if in_arrow is not None else [False] * len(tracked)
+    arr = np.asarray(tracked, dtype=np.int64).reshape(-1, 5)
+    centers = (arr[:, 0:2] + arr[:, 2:4]) // 2
+    light_green = [(arrow_light if a else main_light) == 'green' for a in in_arrow]
+    got = table.update(arr[:, 4], centers, t, in_arrow, light_green, STOP_THRESHOLD, ACCIDENT_TIME)
+    table.mark_collisions(ACCIDENT_TIME, COLLISION_DIST)
+    expected = ref.update(tracked, t, in_arrow, main_light, arrow_light)
+    ref.check_collisions()
+    # Con IDs repetidos el orden de las alertas puede variar; el conjunto debe ser el mismo
+    return sorted((vid, dur, itype) for vid, dur, itype, _ in got), sorted(expected)
+
+
+def assert_same_state(table, ref):
+    assert sorted(table.ids.tolist()) == sorted(ref.data)
+    for vid, expected in ref.data.items():
+        got = table.get(vid)
+        assert got['last_pos'] == expected['last_pos'], vid
+        assert got['accumulated_time'] == pytest.approx(expected['accumulated_time']), vid
+        assert got['incident_type'] == expected['incident_type'], vid
+        assert got['alert_sent'] == expected['alert_sent'], vid
+        assert got['lane_type'] == expected['lane_type'], vid
+
+
+def box(vid, cx, cy, half=10):
+    return [cx - half, cy - half, cx + half, cy + half, vid]
+
+
+def test_stop_time_pauses_on_red_and_resumes_on_green():
+    table, ref = VehicleStateTable(), DictReference()
+    for t, light in [(0, 'green'), (10, 'green'), (15, 'red'), (40, 'red'), (45, 'green')]:
+        step(table, ref, [box(1, 100, 100)], float(t), main_light=light)
+        assert_same_state(table, ref)
+    # Cada actualización suma el tramo previo solo si el semáforo está en VERDE: 0->10 y 40->45
+    assert table.get(1)['accumulated_time'] == pytest.approx(15.0)
+
+
+def test_moving_resets_timer_and_incident():
+    table, ref = VehicleStateTable(), DictReference()
+    for t in (0.0, 15.0, 25.0):
+        step(table, ref, [box(1, 100, 100)], t)
+    assert table.get(1)['incident_type'] == 'breakdown'
+    step(table, ref, [box(1, 100 + STOP_THRESHOLD + 1, 100)], 26.0)
+    assert_same_state(table, ref)
+    assert table.get(1)['accumulated_time'] == 0.0
+    assert table.get(1)['incident_type'] == 'none'
+    assert not table.get(1)['alert_sent']
+
+
+def test_one_alert_per_stop():
+    table, ref = VehicleStateTable(), DictReference()
+    alerts = []
+    for t in range(0, 60, 5):
+        got, expected = step(table, ref, [box(1, 100, 100)], float(t))
+        assert got == pytest.approx(expected)
+        alerts += got
+    assert [a[0] for a in alerts] == [1]
+    # Se mueve y vuelve a detenerse: nueva parada, nueva alerta
+    step(table, ref, [box(1, 300, 100)], 60.0)
+    for t in range(65, 100, 5):
+        got, expected = step(table, ref, [box(1, 300, 100)], float(t))
+        assert got == pytest.approx(expected)
+        alerts += got
+    assert [a[0] for a in alerts] == [1, 1]
+
+
+def test_breakdown_pair_becomes_collision():
+    table, ref = VehicleStateTable(), DictReference()
+    tracked = [box(1, 100, 100), box(2, 150, 100), box(3, 600, 400)]
+    for t in range(0, 30, 5):
+        step(table, ref, tracked, float(t))
+        assert_same_state(table, ref)
+    assert [table.get(v)['incident_type'] for v in (1, 2, 3)] == ['collision', 'collision', 'breakdown']
+
+
+def test_collision_distance_is_strict():
+    table, ref = VehicleStateTable(), DictReference()
+    # Exactamente COLLISION_DIST: no es choque; un píxel menos sí
+    tracked = [box(1, 100, 100), box(2, 100 + COLLISION_DIST, 100),
+               box(3, 500, 300), box(4, 500 + COLLISION_DIST - 1, 300)]
+    for t in range(0, 30, 5):
+        step(table, ref, tracked, float(t))
+        assert_same_state(table, ref)
+    incidents = [table.get(v)['incident_type'] for v in (1, 2, 3, 4)]
+    assert incidents == ['breakdown', 'breakdown', 'collision', 'collision']
+
+
+def test_duplicate_ids_in_one_frame():
+    table, ref = VehicleStateTable(), DictReference()
+    step(table, ref, [box(1, 100, 100)], 0.0)
+    # El mismo ID dos veces: el recorrido secuencial usa ambas apariciones en orden
+    for t, frame in [(10.0, [box(1, 100, 100), box(1, 105, 100)]),
+                     (20.0, [box(1, 105, 100), box(1, 105, 140)]),
+                     (30.0, [box(7, 50, 50), box(7, 52, 50)])]:
+        step(table, ref, frame, t, in_arrow=[False, True])
+        assert_same_state(table, ref)
+
+
+def test_matches_dict_reference_on_random_streams():
+    rng = random.Random(0)
+    table, ref = VehicleStateTable(), DictReference()
+    positions = {}
+    next_id = 0
+    t = 0.0
+    for _ in range(5000):
+        t += rng.choice([0.2, 0.5, 1.0, 3.0])
+        # Altas, bajas y vehículos que se mueven o siguen detenidos
+        for vid in list(positions):
+            if rng.random() < 0.03:
+                del positions[vid]
+            elif rng.random() < 0.2:
+                x, y = positions[vid]
+                positions[vid] = (x + rng.randint(-30, 30), y + rng.randint(-30, 30))
+        while len(positions) < 12 and rng.random() < 0.5:
+            next_id += 1
+            positions[next_id] = (rng.randint(0, 800), rng.randint(0, 600))
+        tracked = [box(vid, x, y) for vid, (x, y) in positions.items()]
+        if tracked and rng.random() < 0.05:
+            tracked.append(list(rng.choice(tracked)))  # ID duplicado en el frame
+        rng.shuffle(tracked)
+        in_arrow = [rng.random() < 0.3 for _ in tracked]
+        lights = rng.choice([('green', 'red'), ('red', 'green'), ('yellow', 'red'), ('green', 'green')])
+        got, expected = step(table, ref, tracked, t, in_arrow, *lights)
+        assert got == pytest.approx(expected)
+        assert_same_state(table, ref)
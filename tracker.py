@@ -55,3 +55,12 @@ class EuclideanDistTracker:
 
         self.center_points = new_center_points.copy()
         return objects_bbs_ids
+
+    def get_state(self):
+        """Estado serializable para reinicio en caliente"""
+        points = [[int(object_id), int(pt[0]), int(pt[1])] for object_id, pt in self.center_points.items()]
+        return {'id_count': self.id_count, 'center_points': points}
+
+    def set_state(self, state):
+        self.id_count = int(state['id_count'])
+        self.center_points = {int(object_id): (int(x), int(y)) for object_id, x, y in state['center_points']}
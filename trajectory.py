@@ -0,0 +1,113 @@
+import numpy as np
+
+
+def apply_homography(H, points):
+    """Proyecta puntos (..., 2) de imagen a coordenadas de suelo con la homografía H (3x3)"""
+    points = np.asarray(points, dtype=np.float64)
+    ones = np.ones(points.shape[:-1] + (1,), dtype=np.float64)
+    proj = np.concatenate([points, ones], axis=-1) @ np.asarray(H, dtype=np.float64).T
+    return proj[..., :2] / proj[..., 2:3]
+
+
+class TrajectoryStore:
+    """
+    Historial acotado de centroides por vehículo de un canal.
+
+    Cada vehículo ocupa un slot con un ring buffer de `capacity` muestras (posición y tiempo).
+    La memoria es fija: max_tracks x capacity, sin importar cuánto tiempo corra el sistema.
+    """
+
+    def __init__(self, capacity, max_tracks):
+        self.capacity = capacity
+        self.max_tracks = max_tracks
+        self.positions = np.zeros((max_tracks, capacity, 2), dtype=np.float32)
+        self.times = np.zeros((max_tracks, capacity), dtype=np.float64)
+        self.clear()
+
+    def clear(self):
+        self.track_ids = np.full(self.max_tracks, -1, dtype=np.int64)
+        self.head = np.zeros(self.max_tracks, dtype=np.int64)  # Siguiente posición a escribir
+        self.count = np.zeros(self.max_tracks, dtype=np.int64)
+
+    def _slots_of(self, ids):
+        """Slot de cada ID (-1 si no tiene)"""
+        occupied = np.flatnonzero(self.track_ids >= 0)
+        slots = np.full(len(ids), -1, dtype=np.int64)
+        if len(occupied) == 0 or len(ids) == 0:
+            return slots
+        order = np.argsort(self.track_ids[occupied])
+        sorted_ids = self.track_ids[occupied][order]
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        found = sorted_ids[pos] == ids
+        slots[found] = occupied[order[pos[found]]]
+        return slots
+
+    def update(self, ids, centers, current_time):
+        """Agrega una muestra por vehículo y libera los slots de los que salieron de pantalla"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        centers = np.asarray(centers, dtype=np.float32).reshape(-1, 2)
+        if len(ids) > 0:
+            _, rev_idx = np.unique(ids[::-1], return_index=True)
+            keep = len(ids) - 1 - rev_idx
+            ids, centers = ids[keep], centers[keep]
+
+        gone = (self.track_ids >= 0) & ~np.isin(self.track_ids, ids)
+        self.track_ids[gone] = -1
+        self.count[gone] = 0
+        self.head[gone] = 0
+
+        slots = self._slots_of(ids)
+        new = np.flatnonzero(slots < 0)
+        free = np.flatnonzero(self.track_ids < 0)[:len(new)]
+        # Si no hay slots libres, los vehículos sobrantes se quedan sin historial
+        slots[new[:len(free)]] = free
+        self.track_ids[free] = ids[new[:len(free)]]
+
+        valid = slots >= 0
+        s = slots[valid]
+        self.positions[s, self.head[s]] = centers[valid]
+        self.times[s, self.head[s]] = current_time
+        self.head[s] = (self.head[s] + 1) % self.capacity
+        self.count[s] = np.minimum(self.count[s] + 1, self.capacity)
+
+    def velocities(self, ids, homography=None, window=None):
+        """
+        Velocidad y rumbo de cada ID a partir de su muestra más reciente y la más antigua de la ventana.
+
+        Args:
+            ids: IDs a consultar (N,).
+            homography: Matriz imagen->suelo (metros). Sin ella el resultado queda en píxeles/s.
+            window: Número de muestras a considerar (por defecto todo el buffer).
+
+        Returns:
+            (velocidad, rumbo_en_grados) con NaN donde aún no hay 2 muestras.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        speed = np.full(len(ids), np.nan)
+        heading = np.full(len(ids), np.nan)
+
+        slots = self._slots_of(ids)
+        valid = slots >= 0
+        valid[valid] = self.count[slots[valid]] >= 2
+        if not valid.any():
+            return speed, heading
+
+        s = slots[valid]
+        span = self.count[s] if window is None else np.minimum(self.count[s], window)
+        newest = (self.head[s] - 1) % self.capacity
+        oldest = (self.head[s] - span) % self.capacity
+
+        p_new = self.positions[s, newest].astype(np.float64)
+        p_old = self.positions[s, oldest].astype(np.float64)
+        if homography is not None:
+            p_new = apply_homography(homography, p_new)
+            p_old = apply_homography(homography, p_old)
+
+        dt = self.times[s, newest] - self.times[s, oldest]
+        delta = p_new - p_old
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v = np.hypot(delta[:, 0], delta[:, 1]) / dt
+        v[dt <= 0] = np.nan
+        speed[valid] = v
+        heading[valid] = np.degrees(np.arctan2(delta[:, 1], delta[:, 0]))
+        return speed, heading
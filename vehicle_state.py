@@ -0,0 +1,244 @@
+import numpy as np
+
+try:
+    # KD-Tree para buscar pares cercanos en O(n log n)
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Códigos compactos para las columnas categóricas
+INCIDENT_TYPES = ('none', 'breakdown', 'collision')
+LANE_TYPES = ('unknown', 'main', 'arrow')
+
+INCIDENT_NONE, INCIDENT_BREAKDOWN, INCIDENT_COLLISION = 0, 1, 2
+LANE_UNKNOWN, LANE_MAIN, LANE_ARROW = 0, 1, 2
+
+
+def boxes_to_centers(tracked_objects):
+    """
+    Convierte la salida del tracker en arreglos.
+
+    Args:
+        tracked_objects: Lista de cajas con ID [x, y, x2, y2, id].
+
+    Returns:
+        (ids, centros) con formas (N,) y (N, 2).
+    """
+    arr = np.asarray(tracked_objects, dtype=np.int64).reshape(-1, 5)
+    ids = arr[:, 4].copy()
+    centers = (arr[:, 0:2] + arr[:, 2:4]) // 2
+    return ids, centers
+
+
+def close_pairs(points, max_dist):
+    """Retorna los pares (i, j), i < j, cuya distancia euclidiana es estrictamente menor a max_dist"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    if cKDTree is not None:
+        pairs = cKDTree(points).query_pairs(max_dist, output_type='ndarray')
+        if len(pairs) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+        # query_pairs incluye la distancia exacta (<=); conservamos el criterio estricto (<)
+        d = np.hypot(*(points[pairs[:, 0]] - points[pairs[:, 1]]).T)
+        return pairs[d < max_dist]
+
+    # Sin SciPy: matriz de distancias completa (suficiente para pocos vehículos detenidos)
+    diff = points[:, None, :] - points[None, :, :]
+    dist = np.hypot(diff[..., 0], diff[..., 1])
+    i, j = np.nonzero(np.triu(dist < max_dist, k=1))
+    return np.stack([i, j], axis=1)
+
+
+class VehicleStateTable:
+    """
+    Estado de los vehículos de un canal en formato columnar (struct-of-arrays).
+
+    Cada columna es un arreglo de NumPy y las filas se mantienen ordenadas por ID,
+    de modo que emparejar los IDs del tracker es un searchsorted en lugar de
+    búsquedas por diccionario vehículo por vehículo.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.last_pos = np.empty((0, 2), dtype=np.int64)
+        self.accumulated_time = np.empty(0, dtype=np.float64)
+        self.last_update_time = np.empty(0, dtype=np.float64)
+        self.incident = np.empty(0, dtype=np.int8)
+        self.alert_sent = np.empty(0, dtype=bool)
+        self.lane = np.empty(0, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, vehicle_id):
+        return self._row(vehicle_id) >= 0
+
+    def _row(self, vehicle_id):
+        i = int(np.searchsorted(self.ids, vehicle_id))
+        if i < len(self.ids) and self.ids[i] == vehicle_id:
+            return i
+        return -1
+
+    def get(self, vehicle_id, default=None):
+        """Vista tipo diccionario de un vehículo (mismas llaves que el formato anterior)"""
+        i = self._row(vehicle_id)
+        if i < 0:
+            return default
+        return {
+            'last_pos': (int(self.last_pos[i, 0]), int(self.last_pos[i, 1])),
+            'accumulated_time': float(self.accumulated_time[i]),
+            'last_update_time': float(self.last_update_time[i]),
+            'incident_type': INCIDENT_TYPES[self.incident[i]],
+            'alert_sent': bool(self.alert_sent[i]),
+            'lane_type': LANE_TYPES[self.lane[i]]
+        }
+
+    def update(self, ids, centers, current_time, in_arrow, light_green, stop_threshold, accident_time,
+               speeds=None, stop_speed=None):
+        """
+        Actualiza en bloque el estado con las detecciones del frame actual.
+
+        Args:
+            ids: IDs del tracker (N,).
+            centers: Centros de cada caja (N, 2).
+            current_time: Marca de tiempo de la actualización.
+            in_arrow: Máscara (N,) de vehículos dentro de la zona de flecha.
+            light_green: Máscara (N,) indicando si el semáforo relevante de cada vehículo está en VERDE.
+            stop_threshold: Desplazamiento (px) por debajo del cual el vehículo se considera detenido.
+            accident_time: Segundos detenido en VERDE para considerar avería.
+            speeds: Velocidad real (m/s) de cada vehículo, NaN si no se conoce. Opcional.
+            stop_speed: Velocidad (m/s) por debajo de la cual el vehículo se considera detenido.
+                Donde hay velocidad se usa este criterio; donde no, el desplazamiento en píxeles.
+
+        Returns:
+            Lista de alertas nuevas [(id, duración, tipo_incidente, posición)].
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        in_arrow = np.asarray(in_arrow, dtype=bool).reshape(-1)
+        light_green = np.asarray(light_green, dtype=bool).reshape(-1)
+        if speeds is None:
+            speeds = np.full(len(ids), np.nan)
+        speeds = np.asarray(speeds, dtype=np.float64).reshape(-1)
+
+        # Un ID repetido en el mismo frame se aplica en orden, como en el recorrido secuencial:
+        # la primera aparición en la pasada principal y cada repetición en una pasada extra
+        order = np.argsort(ids, kind='stable')
+        run_start = np.r_[True, ids[order][1:] != ids[order][:-1]] if len(ids) else np.zeros(0, dtype=bool)
+        starts = np.flatnonzero(run_start)
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[order] = np.arange(len(ids)) - np.repeat(starts, np.diff(np.r_[starts, len(ids)]))
+
+        first = order[run_start]  # Primera aparición de cada ID, ya ordenada por ID
+        n = len(first)
+        uids = ids[first]
+        rows = np.searchsorted(self.ids, uids)
+        if len(self.ids) > 0:
+            known = self.ids[np.minimum(rows, len(self.ids) - 1)] == uids
+        else:
+            known = np.zeros(n, dtype=bool)
+        k_idx = np.flatnonzero(known)
+        k_rows = rows[known]
+
+        # Vehículos nuevos con valores iniciales; los conocidos heredan su fila. Los que ya no
+        # están en pantalla se descartan al reemplazar las columnas.
+        last_pos = centers[first].copy()
+        accumulated = np.zeros(n, dtype=np.float64)
+        last_update = np.full(n, current_time, dtype=np.float64)
+        incident = np.full(n, INCIDENT_NONE, dtype=np.int8)
+        alert_sent = np.zeros(n, dtype=bool)
+        lane = np.full(n, LANE_UNKNOWN, dtype=np.int8)
+        last_pos[k_idx] = self.last_pos[k_rows]
+        accumulated[k_idx] = self.accumulated_time[k_rows]
+        last_update[k_idx] = self.last_update_time[k_rows]
+        incident[k_idx] = self.incident[k_rows]
+        alert_sent[k_idx] = self.alert_sent[k_rows]
+        lane[k_idx] = self.lane[k_rows]
+        self.ids, self.last_pos, self.accumulated_time, self.last_update_time = uids, last_pos, accumulated, last_update
+        self.incident, self.alert_sent, self.lane = incident, alert_sent, lane
+
+        args = (current_time, stop_threshold, accident_time, stop_speed)
+        det = first[k_idx]
+        alerts = self._step(k_idx, centers[det], in_arrow[det], light_green[det], speeds[det], *args)
+        for k in range(1, int(rank.max()) + 1 if len(rank) else 0):
+            det = np.flatnonzero(rank == k)
+            k_rows = np.searchsorted(self.ids, ids[det])
+            alerts += self._step(k_rows, centers[det], in_arrow[det], light_green[det], speeds[det], *args)
+        return alerts
+
+    def _step(self, rows, centers, in_arrow, light_green, speeds, current_time, stop_threshold, accident_time,
+              stop_speed):
+        """Actualiza en el lugar las filas `rows` (vehículos ya conocidos) con una aparición cada una"""
+        prev_pos = self.last_pos[rows]
+        delta = centers - prev_pos
+        dist = np.hypot(delta[:, 0], delta[:, 1])
+        dt = current_time - self.last_update_time[rows]
+        accumulated = self.accumulated_time[rows]
+        incident = self.incident[rows]
+        alert_sent = self.alert_sent[rows]
+
+        # El auto se mueve: reiniciar contadores
+        moving = dist > stop_threshold
+        if stop_speed is not None:
+            has_speed = ~np.isnan(speeds)
+            moving[has_speed] = speeds[has_speed] > stop_speed
+        accumulated[moving] = 0.0
+        incident[moving] = INCIDENT_NONE
+        alert_sent[moving] = False
+
+        # Detenido en VERDE: sumar tiempo. En ROJO/AMARILLO el acumulado queda en pausa.
+        stopped_green = ~moving & light_green
+        accumulated[stopped_green] += dt[stopped_green]
+
+        over = stopped_green & (accumulated > accident_time)
+        incident[over & (incident == INCIDENT_NONE)] = INCIDENT_BREAKDOWN
+        fire = np.flatnonzero(over & ~alert_sent)
+        alert_sent[fire] = True
+
+        self.accumulated_time[rows] = accumulated
+        self.incident[rows] = incident
+        self.alert_sent[rows] = alert_sent
+        self.lane[rows] = np.where(in_arrow, LANE_ARROW, LANE_MAIN)
+        self.last_pos[rows] = centers
+        self.last_update_time[rows] = current_time
+        return [(int(self.ids[rows[i]]), float(accumulated[i]), INCIDENT_TYPES[incident[i]],
+                 (int(prev_pos[i, 0]), int(prev_pos[i, 1]))) for i in fire]
+
+    def to_dict(self):
+        """Columnas como listas (serializable a JSON)"""
+        return {
+            'ids': self.ids.tolist(),
+            'last_pos': self.last_pos.tolist(),
+            'accumulated_time': self.accumulated_time.tolist(),
+            'incident': self.incident.tolist(),
+            'alert_sent': self.alert_sent.tolist(),
+            'lane': self.lane.tolist()
+        }
+
+    def load_dict(self, data, current_time):
+        """
+        Restaura las columnas desde to_dict(). El último instante de actualización se fija en
+        current_time para que el tiempo fuera de línea no cuente como tiempo detenido.
+        """
+        order = np.argsort(np.asarray(data['ids'], dtype=np.int64), kind='stable')
+        self.ids = np.asarray(data['ids'], dtype=np.int64)[order]
+        self.last_pos = np.asarray(data['last_pos'], dtype=np.int64).reshape(-1, 2)[order]
+        self.accumulated_time = np.asarray(data['accumulated_time'], dtype=np.float64)[order]
+        self.last_update_time = np.full(len(self.ids), current_time, dtype=np.float64)
+        self.incident = np.asarray(data['incident'], dtype=np.int8)[order]
+        self.alert_sent = np.asarray(data['alert_sent'], dtype=bool)[order]
+        self.lane = np.asarray(data['lane'], dtype=np.int8)[order]
+
+    def mark_collisions(self, accident_time, collision_dist):
+        """Marca como 'collision' los pares de vehículos detenidos más cerca que collision_dist"""
+        stopped = np.flatnonzero(self.accumulated_time > accident_time)
+        if len(stopped) < 2:
+            return
+        pairs = close_pairs(self.last_pos[stopped], collision_dist)
+        if len(pairs) > 0:
+            self.incident[stopped[pairs.ravel()]] = INCIDENT_COLLISION
@@ -2,6 +2,9 @@ import cv2
 import numpy as np
 import config as cfg
 
+EDIT_MENU_W = 300  # Ancho del menú lateral del editor
+DASHBOARD_MENU_W = 350  # Ancho del menú lateral del dashboard
+
 
 def draw_traffic_light(frame, state, position):
     """Dibuja el semáforo principal"""
@@ -32,6 +35,141 @@ def draw_direction_arrow(frame, idx, arrow_state):
     cv2.polylines(frame, [pts], True, (255, 255, 255), 1)
 
 
+def draw_heatmap(frame, heatmap, alpha=0.45):
+    """Mezcla una rejilla de ocupación (x0, y0, celda, valores 0-1) sobre su zona del frame"""
+    x0, y0, cell, values = heatmap
+    h, w = frame.shape[:2]
+    rows, cols = values.shape
+    # Recorte a los límites del frame
+    fx0, fy0 = max(x0, 0), max(y0, 0)
+    fx1, fy1 = min(x0 + cols * cell, w), min(y0 + rows * cell, h)
+    if fx1 <= fx0 or fy1 <= fy0:
+        return
+    colors = cv2.applyColorMap((values * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    big = cv2.resize(colors, (cols * cell, rows * cell), interpolation=cv2.INTER_NEAREST)
+    weight = np.repeat(np.repeat(values, cell, axis=0), cell, axis=1)
+    big = big[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0]
+    weight = weight[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0, None] * alpha
+    roi = frame[fy0:fy1, fx0:fx1]
+    roi[:] = (roi * (1.0 - weight) + big * weight).astype(np.uint8)
+
+
+def draw_vehicle_boxes(frame, tracked_objects, vehicle_data, accident_time, scale=1.0):
+    """
+    Cajas y etiquetas de cada vehículo según su tiempo detenido y tipo de incidente.
+    scale: relación entre `frame` y la resolución de las cajas (p. ej. mosaico / cámara).
+    """
+
+    def s(v):
+        return int(round(v * scale))
+
+    def t(v):
+        return max(1, s(v))
+
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    for obj in tracked_objects:
+        x, y, x2, y2, vid = obj
+        v_data = vehicle_data.get(vid, {})
+        accum = v_data.get('accumulated_time', 0)
+        itype = v_data.get('incident_type', 'none')
+        x, y, x2, y2 = s(x), s(y), s(x2), s(y2)
+
+        if itype == 'breakdown' or accum > accident_time:
+            color = (0, 0, 255)
+            cv2.rectangle(frame, (x, y), (x2, y2), color, t(4))
+            mins = int(accum // 60)
+            secs = int(accum % 60)
+            label = f"ALERTA {mins:02d}:{secs:02d}"
+            (w_text, h_text), _ = cv2.getTextSize(label, font, 0.8 * scale, t(2))
+            cv2.rectangle(frame, (x, y - s(35)), (x + w_text + s(10), y), color, -1)
+            cv2.putText(frame, label, (x + s(5), y - s(10)), font, 0.8 * scale, (255, 255, 255), t(2))
+        elif itype == 'collision':
+            color = (255, 0, 255)
+            label = f"CHOQUE {int(accum)}s"
+            cv2.rectangle(frame, (x, y), (x2, y2), color, t(4))
+            cv2.putText(frame, label, (x, y - s(10)), font, 0.6 * scale, color, t(2))
+        else:
+            color = (255, 0, 0)
+            if accum > 10.0:
+                color = (0, 255, 255)
+                label = f"ID:{vid} | {int(accum)}s"
+                cv2.rectangle(frame, (x, y), (x2, y2), color, t(2))
+                cv2.putText(frame, label, (x, y - s(5)), font, 0.6 * scale, color, t(2))
+            else:
+                cv2.rectangle(frame, (x, y), (x2, y2), color, 1)
+                cv2.putText(frame, f"ID:{vid}", (x, y - s(5)), font, 0.5 * scale, color, 1)
+
+
+class AnnotationLayer:
+    """
+    Capa de anotaciones de una cámara a resolución de display (el mosaico), dibujada una vez por
+    actualización de tracks y compuesta sobre cada mosaico sin volver a dibujar.
+
+    La capa se dibuja dos veces, sobre negro y sobre blanco: la diferencia da la transparencia
+    de cada píxel (el texto de OpenCV puede venir suavizado). Los píxeles opacos se copian con
+    una sola copia enmascarada (cv2.copyTo) del recuadro que contiene todo lo dibujado; los de
+    borde, semitransparentes, se mezclan aparte con su alfa precalculado.
+    """
+
+    def __init__(self):
+        self.source = None
+        self.key = None
+        self.black = None
+        self.white = None
+        self.roi = None
+        self.layer = None
+        self.mask = None
+        self.edge = None
+        self.rebuilds = 0
+
+    def is_stale(self, source, key):
+        """
+        source: objeto del que sale la capa (la lista de tracks); se compara por identidad.
+        key: todo lo demás que cambia el dibujo (resoluciones de cámara y mosaico).
+        """
+        return source is not self.source or key != self.key
+
+    def rebuild(self, source, key, shape, draw):
+        """Redibuja la capa con draw(lienzo) sobre lienzos de forma `shape`"""
+        if self.black is None or self.black.shape != shape:
+            self.black = np.empty(shape, dtype=np.uint8)
+            self.white = np.empty(shape, dtype=np.uint8)
+        self.black.fill(0)
+        self.white.fill(255)
+        draw(self.black)
+        draw(self.white)
+        self.source, self.key = source, key
+        self.rebuilds += 1
+        self.roi, self.edge = None, None
+
+        # 255 * (1 - alfa) por canal. Todo con OpenCV (las reducciones por eje de numpy son lentas);
+        # la escala de grises basta para clasificar opaco / borde con error de un nivel de intensidad
+        inv = cv2.subtract(self.white, self.black)
+        inv_gray = cv2.cvtColor(inv, cv2.COLOR_BGR2GRAY)
+        drawn = cv2.compare(inv_gray, 255, cv2.CMP_LT)
+        x, y, w, h = cv2.boundingRect(drawn)
+        if w == 0 or h == 0:
+            return
+        self.roi = (slice(y, y + h), slice(x, x + w))
+        self.layer = self.black[self.roi].copy()
+        self.mask = cv2.compare(inv_gray[self.roi], 0, cv2.CMP_EQ)
+
+        points = cv2.findNonZero(cv2.bitwise_and(drawn[self.roi], cv2.bitwise_not(self.mask)))
+        if points is not None:
+            points = points.reshape(-1, 2)
+            xs, ys = points[:, 0] + x, points[:, 1] + y
+            self.edge = (ys, xs, self.black[ys, xs].astype(np.uint16), inv[ys, xs].astype(np.uint16))
+
+    def composite(self, frame):
+        if self.roi is None:
+            return frame
+        cv2.copyTo(self.layer, self.mask, frame[self.roi])
+        if self.edge is not None:
+            ys, xs, color, inv = self.edge
+            frame[ys, xs] = color + (frame[ys, xs] * inv + 127) // 255
+        return frame
+
+
 def add_overlay(frame, channel, name, idx, system_state):
     """Dibuja la información sobre cada cámara individual"""
     height, width = frame.shape[:2]
@@ -42,6 +180,9 @@ def add_overlay(frame, channel, name, idx, system_state):
     mode_txt = f"Modo: {cfg.SYSTEM_MODES[system_state['mode']]}"
     col = (0, 255, 0) if system_state['status'] == 'active' else (0, 0, 255)
     cv2.putText(frame, mode_txt, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, col, 1)
+    if system_state.get('qos_level', 0) > 0:
+        cv2.putText(frame, f"QoS: nivel {system_state['qos_level']}", (10, 85), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                    (0, 165, 255), 1)
 
     # Semáforos
     draw_traffic_light(frame, system_state['traffic_color'], (width - 40, 40))
@@ -52,10 +193,16 @@ def add_overlay(frame, channel, name, idx, system_state):
 
     # Debug Visual (Zonas y Conteos)
     if system_state['mode'] == 'INTELLIGENT' and system_state['counts']:
-        cv2.putText(frame, f"RECTO: {system_state['counts']['main']}", (10, height - 60),
+        for heat in system_state.get('heatmaps', []):
+            draw_heatmap(frame, heat)
+
+        occ = system_state.get('occupancy', {})
+        occ_txt = {k: f" | {occ[k]['occupancy'] * 100:.0f}% cola {occ[k]['queue_px']}px" if k in occ else ""
+                   for k in ('main', 'arrow')}
+        cv2.putText(frame, f"RECTO: {system_state['counts']['main']}{occ_txt['main']}", (10, height - 60),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
         if idx in [cfg.ESTE_IDX, cfg.OESTE_IDX]:
-            cv2.putText(frame, f"FLECHA: {system_state['counts']['arrow']}", (10, height - 30),
+            cv2.putText(frame, f"FLECHA: {system_state['counts']['arrow']}{occ_txt['arrow']}", (10, height - 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
 
         main_z, arrow_z = system_state['zones']
@@ -70,13 +217,18 @@ def add_overlay(frame, channel, name, idx, system_state):
     return frame
 
 
-def draw_edit_mode(frame, points, camera_name, zone_type):
-    """Dibuja la interfaz de EDICIÓN con menú lateral."""
+def draw_edit_mode(frame, points, camera_name, zone_type, canvas=None):
+    """
+    Dibuja la interfaz de EDICIÓN con menú lateral.
+    canvas: lienzo (h, w + EDIT_MENU_W) a reutilizar; si `frame` ya es su parte izquierda no se copia.
+    """
     h, w = frame.shape[:2]
-    MENU_W = 300
+    MENU_W = EDIT_MENU_W
 
-    canvas = np.zeros((h, w + MENU_W, 3), dtype=np.uint8)
-    canvas[:, :w] = frame
+    if canvas is None:
+        canvas = np.zeros((h, w + MENU_W, 3), dtype=np.uint8)
+    if not np.shares_memory(canvas, frame):
+        canvas[:, :w] = frame
     canvas[:, w:] = (40, 40, 40)  # Fondo gris
 
     # Dibujo sobre video
@@ -114,18 +266,21 @@ def draw_edit_mode(frame, points, camera_name, zone_type):
     return canvas
 
 
-def draw_dashboard(grid_frame, info_data, stats_data=None):
+def draw_dashboard(grid_frame, info_data, stats_data=None, canvas=None):
     """
     Dibuja el menú lateral principal (Dashboard) junto al grid de cámaras.
     info_data: {phase_idx, active_cams, intelligent_cams}
-    stats_data: (vehicle_counts, total_cars, total_incidents)
+    stats_data: (vehicle_counts, total_cars, total_incidents, approach_speeds)
+    canvas: lienzo (h, w + DASHBOARD_MENU_W) a reutilizar; si el grid ya vive en él no se copia.
     """
     h, w = grid_frame.shape[:2]
-    MENU_W = 350  # Ancho del menú lateral
+    MENU_W = DASHBOARD_MENU_W  # Ancho del menú lateral
 
-    # Crear lienzo grande
-    canvas = np.zeros((h, w + MENU_W, 3), dtype=np.uint8)
-    canvas[:, :w] = grid_frame
+    # Crear lienzo grande (o reutilizar el del pool)
+    if canvas is None:
+        canvas = np.zeros((h, w + MENU_W, 3), dtype=np.uint8)
+    if not np.shares_memory(canvas, grid_frame):
+        canvas[:, :w] = grid_frame
     canvas[:, w:] = (30, 30, 30)
 
     ui_x = w + 20
@@ -136,7 +291,7 @@ def draw_dashboard(grid_frame, info_data, stats_data=None):
 
     # --- ESTADÍSTICAS EN VIVO ---
     if stats_data:
-        v_counts, total_cars, total_incidents = stats_data
+        v_counts, total_cars, total_incidents, speeds = stats_data
 
         cv2.putText(canvas, "ESTADISTICAS (HOY)", (ui_x, 85), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 1)
 
@@ -152,6 +307,8 @@ def draw_dashboard(grid_frame, info_data, stats_data=None):
             short_name = name.replace("Camara ", "")
             count = v_counts.get(name, 0)
             text = f"{short_name}: {count}"
+            if speeds.get(name) is not None:
+                text += f" | {speeds[name] * 3.6:.0f} km/h"
             cv2.putText(canvas, text, (ui_x, y_stat), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
             y_stat += 25
     else: